@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*- 
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy as np
+import pandas as pd
+
+from fijitools.analysis.raster import Spans, clip_spans, rasterize, \
+    spans_to_pixels
+from fijitools.helpers.geometry import area_many, centroid_many, \
+    feret_many, perimeter_many
+from fijitools.helpers.iteration import expand_ranges
+
+
+# same column names as FIJI's Results table
+COLUMNS = ['Area', 'Mean', 'Min', 'Max', 'IntDen', 'RawIntDen']
+SHAPE_COLUMNS = ['Area', 'X', 'Y', 'Perim.', 'Feret', 'FeretAngle',
+                 'MinFeret']
+
+
+def region_stats(values, ids, n, pixel_area=1.):
+    """
+    Statistics of pixel values grouped by ROI, with one bincount or reduceat
+    call per statistic.
+
+    Parameters
+    -----------
+    values: numpy.ndarray
+    (P, ) pixel values.
+
+    ids: numpy.ndarray
+    (P, ) ROI index of each pixel, 0 <= ids < n.
+
+    n: int
+    Number of ROI.
+
+    pixel_area: float
+    Area of a pixel, e.g. pixelsize**2, for the Area and IntDen columns.
+
+    Returns
+    -----------
+    dict
+    Arrays of length n keyed by COLUMNS. Mean, Min and Max are NaN for ROI
+    without pixels.
+    """
+    values = np.asarray(values, dtype=float)
+    ids = np.asarray(ids, dtype=np.int64)
+    if np.any(ids[1:] < ids[:-1]):
+        order = np.argsort(ids, kind='stable')
+        values, ids = values[order], ids[order]
+    count = np.bincount(ids, minlength=n)
+    raw = np.bincount(ids, weights=values, minlength=n)
+    mean = np.full(n, np.nan)
+    minimum = np.full(n, np.nan)
+    maximum = np.full(n, np.nan)
+    present = count > 0
+    mean[present] = raw[present] / count[present]
+    # pixels of each ROI are contiguous; reduce each non-empty segment
+    starts = (np.cumsum(count) - count)[present]
+    if len(values):
+        minimum[present] = np.minimum.reduceat(values, starts)
+        maximum[present] = np.maximum.reduceat(values, starts)
+    area = count * pixel_area
+    return {'Area': area, 'Mean': mean, 'Min': minimum, 'Max': maximum,
+            'IntDen': area * np.nan_to_num(mean), 'RawIntDen': raw}
+
+
+def measure(image, spans, n=None, pixel_area=1.):
+    """
+    Measure every ROI in a single image.
+
+    Parameters
+    -----------
+    image: numpy.ndarray
+    (X, Y) image indexed image[x, y]. May be a numpy.memmap, in which case
+    only pixels inside ROI are read.
+
+    spans: Spans
+    See raster.rasterize(). ROI pixels outside the image are ignored.
+
+    n: int
+    Number of ROI. Defaults to the largest ROI index in spans + 1.
+
+    pixel_area: float
+
+    Returns
+    -----------
+    pandas.DataFrame
+    One row per ROI, with COLUMNS.
+    """
+    spans = clip_spans(spans, (0, 0), image.shape[:2])
+    ids, x, y = spans_to_pixels(spans)
+    if n is None:
+        n = ids.max() + 1 if len(ids) else 0
+    return pd.DataFrame(region_stats(image[x, y], ids, n, pixel_area),
+                        columns=COLUMNS)
+
+
+def _planes(positions, shape):
+    """
+    Expand ImageJ c, z, t positions (1-indexed; 0 means every position)
+    into one row per plane of a stack.
+
+    Returns
+    -----------
+    rois: numpy.ndarray
+    Index of the ROI in each row.
+
+    planes: numpy.ndarray
+    (R, 3) 0-indexed c, z, t of each row.
+    """
+    positions = np.asarray(positions, dtype=np.int64).reshape((-1, 3))
+    shape = np.asarray(shape, dtype=np.int64)
+    # number of values each ROI takes along each axis
+    sizes = np.where(positions > 0, 1, shape)
+    rois, local = expand_ranges(np.zeros(len(positions), np.int64),
+                                sizes.prod(axis=1))
+    planes = np.empty((len(rois), 3), dtype=np.int64)
+    for axis in reversed(range(3)):
+        size = sizes[rois, axis]
+        planes[:, axis] = np.where(positions[rois, axis] > 0,
+                                   positions[rois, axis] - 1, local % size)
+        local = local // size
+    return rois, planes
+
+
+def measure_stack(stack, table, spans=None, pixel_area=1.):
+    """
+    Measure every ROI of a roi_table.ROITable on the planes of a hyperstack
+    given by its c, z, t positions. ROI whose position is 0 along an axis,
+    i.e. shown on every channel, slice or frame, are measured on each.
+
+    Parameters
+    -----------
+    stack: numpy.ndarray
+    (C, Z, T, X, Y) array, e.g. a numpy.memmap. Planes are read one at a
+    time, and only at ROI pixels.
+
+    table: ROITable
+
+    spans: Spans
+    Defaults to raster.rasterize(table).
+
+    pixel_area: float
+
+    Returns
+    -----------
+    pandas.DataFrame
+    One row per ROI and plane, with columns 'roi', 'c', 'z', 't'
+    (0-indexed) followed by COLUMNS.
+    """
+    if spans is None:
+        spans = rasterize(table)
+    spans = clip_spans(spans, (0, 0), stack.shape[3:5])
+    positions = np.stack([table.common[k] for k in ('c', 'z', 't')], axis=1)
+    rois, planes = _planes(positions, stack.shape[:3])
+    flat = np.ravel_multi_index(planes.T, stack.shape[:3])
+    # spans of ROI i are spans[bounds[i]:bounds[i + 1]]
+    bounds = np.searchsorted(spans.ids, np.arange(len(table) + 1))
+
+    stats = {k: np.zeros(len(rois)) for k in COLUMNS}
+    order = np.argsort(flat, kind='stable')
+    plane_bounds = np.flatnonzero(np.diff(flat[order])) + 1
+    for rows in np.split(order, plane_bounds):
+        if not len(rows):
+            continue
+        # gather the spans of every ROI measured on this plane
+        owners, selected = expand_ranges(
+            bounds[rois[rows]], np.diff(bounds)[rois[rows]])
+        plane_spans = Spans(owners, *[arr[selected] for arr in spans[1:]])
+        ids, x, y = spans_to_pixels(plane_spans)
+        c, z, t = planes[rows[0]]
+        result = region_stats(stack[c, z, t][x, y], ids, len(rows),
+                              pixel_area)
+        for k in COLUMNS:
+            stats[k][rows] = result[k]
+
+    ret = pd.DataFrame({'roi': rois, 'c': planes[:, 0], 'z': planes[:, 1],
+                        't': planes[:, 2]})
+    for k in COLUMNS:
+        ret[k] = stats[k]
+    return ret
+
+
+def measure_shapes(table, pixelsize=1.):
+    """
+    FIJI's geometric measurements of every ROI in a roi_table.ROITable,
+    computed from the vertices of all ROI at once: polygon (shoelace) area,
+    centroid of the enclosed area, perimeter and Feret diameters.
+
+    Parameters
+    -----------
+    table: ROITable
+
+    pixelsize: float
+    Length of a pixel side, to scale the results.
+
+    Returns
+    -----------
+    pandas.DataFrame
+    One row per ROI, with SHAPE_COLUMNS. Area and centroid are NaN for
+    lines; everything is NaN for ROI without vertices, e.g. rectangles.
+    """
+    coordinates, offsets = table.coordinates, table.offsets
+    closed = table.closed
+    has_vertices = table.n_coordinates > 0
+    area = np.where(closed, area_many(coordinates, offsets), np.nan)
+    centroid = np.where(closed[:, None], centroid_many(coordinates, offsets),
+                        np.nan)
+    perimeter = perimeter_many(coordinates, offsets, closed)
+    feret, min_feret, angle = feret_many(coordinates, offsets)
+    ret = pd.DataFrame({'Area': area * pixelsize**2,
+                        'X': centroid[:, 0] * pixelsize,
+                        'Y': centroid[:, 1] * pixelsize,
+                        'Perim.': perimeter * pixelsize,
+                        'Feret': feret * pixelsize,
+                        'FeretAngle': angle,
+                        'MinFeret': min_feret * pixelsize},
+                       columns=SHAPE_COLUMNS)
+    ret[~has_vertices] = np.nan
+    return ret
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*- 
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy as np
+import scipy.ndimage as ndi
+
+from fijitools.helpers.geometry import neighbours, resample_many, spline
+from fijitools.io.roi import OPTIONS
+
+
+class ProfileGrid(object):
+    """
+    Sampling grid for intensity profiles along many lines at once. Each
+    sample along a line is widened into a row of points perpendicular to
+    it; the profile is the mean across each row. Building the grid is the
+    expensive part, so keep the instance and call profiles() for every
+    image, e.g. every timepoint, of the same ROI.
+
+    Parameters
+    -----------
+    samples: numpy.ndarray
+    (M, 2) x, y coordinates along all lines concatenated together, in
+    pixels, e.g. from helpers.geometry.resample_many().
+
+    offsets: numpy.ndarray
+    (N + 1, ) array. The samples of line i are samples[offsets[i]:
+    offsets[i + 1]].
+
+    thickness: float
+    Distance to widen the line by on either side, so the total width is
+    2 * thickness. Across the width, points are at most 0.5 pixels apart.
+
+    closed: bool or numpy.ndarray
+    Whether the lines, or each line, are closed.
+    """
+
+    def __init__(self, samples, offsets, thickness=0., closed=False):
+        self.samples = np.asarray(samples, dtype=float).reshape((-1, 2))
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.thickness = thickness
+        n_width = 2 * int(np.ceil(thickness / 0.5)) + 1
+        self.widths = np.linspace(-thickness, thickness, n_width)
+
+        # unit normal from the central difference of neighbouring samples
+        previous, following = neighbours(self.offsets, closed)
+        tangent = self.samples[following] - self.samples[previous]
+        norm = np.hypot(*tangent.T)
+        tangent /= np.where(norm > 0, norm, 1)[:, None]
+        normal = np.stack([-tangent[:, 1], tangent[:, 0]], axis=1)
+
+        grid = self.samples[:, None, :] + \
+            self.widths[None, :, None] * normal[:, None, :]
+        # ROI coordinates place pixel centers at + 0.5, map_coordinates at
+        # whole numbers
+        self.coordinates = grid.reshape((-1, 2)).T - 0.5
+
+    @classmethod
+    def from_curves(cls, coordinates, offsets, thickness=0., spacing=1.,
+                    closed=False):
+        """
+        Grid along vertices of many ROI, resampled every spacing pixels.
+        """
+        samples, offsets = resample_many(coordinates, offsets, spacing,
+                                         closed)
+        return cls(samples, offsets, thickness, closed)
+
+    @classmethod
+    def from_table(cls, table, rows=None, thickness=0., spacing=1.):
+        """
+        Grid along ROI of a roi_table.ROITable, all of them by default.
+        Spline fit ROI are sampled along their spline.
+        """
+        if rows is None:
+            rows = np.arange(len(table))
+        rows = np.asarray(rows, dtype=np.int64)
+        closed = table.closed[rows]
+        splined = (table.common['options'][rows] &
+                   OPTIONS['spline_fit']).astype(bool)
+
+        vertices = [table.points(i) for i in rows]
+        # straight ROI are resampled together; splines can't be batched, and
+        # are sampled one at a time
+        straight = np.flatnonzero(~splined)
+        samples, offsets = resample_many(
+            np.concatenate([vertices[j] for j in straight] +
+                           [np.zeros((0, 2))]),
+            np.concatenate([[0], np.cumsum([len(vertices[j])
+                                            for j in straight])]),
+            spacing, closed[straight])
+        if np.any(splined):
+            pieces = [None]*len(rows)
+            for j, piece in zip(straight, np.split(samples, offsets[1:-1])):
+                pieces[j] = piece
+            for j in np.flatnonzero(splined):
+                pieces[j] = spline(vertices[j], spacing, closed[j])
+            samples = np.concatenate(pieces)
+            offsets = np.concatenate([[0], np.cumsum(list(map(len,
+                                                                pieces)))])
+        return cls(samples, offsets, thickness, closed)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def profiles(self, image, order=1):
+        """
+        Sample image, indexed image[x, y], along every line with a single
+        scipy.ndimage.map_coordinates call.
+
+        Parameters
+        -----------
+        image: numpy.ndarray
+
+        order: int
+        Spline interpolation order; see scipy.ndimage.map_coordinates.
+
+        Returns
+        -----------
+        numpy.ndarray
+        (M, ) mean intensity at each sample; the profile of line i is
+        values[self.offsets[i]:self.offsets[i + 1]].
+        """
+        values = ndi.map_coordinates(image, self.coordinates, order=order,
+                                     mode='nearest')
+        return values.reshape((-1, len(self.widths))).mean(axis=1)
+
+    def split(self, values):
+        """
+        Split the output of profiles() into one array per line.
+        """
+        return np.split(values, self.offsets[1:-1])
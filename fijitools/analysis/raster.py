@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*- 
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from fijitools.helpers.iteration import expand_ranges
+from fijitools.io.roi import ROI_TYPE
+
+
+# horizontal runs of pixels: pixels x = start ... stop - 1 at y = row
+# belong to ROI ids
+Spans = namedtuple('Spans', ['ids', 'rows', 'starts', 'stops'])
+
+# ROI types whose vertices enclose an area
+FILLED_TYPES = [ROI_TYPE['polygon'], ROI_TYPE['freehand'], ROI_TYPE['traced']]
+
+
+def _empty_spans():
+    empty = np.zeros(0, dtype=np.int64)
+    return Spans(empty, empty, empty, empty)
+
+
+def _to_pixel(values):
+    # index of the first pixel whose center is at or after values
+    return np.ceil(np.asarray(values) - 0.5).astype(np.int64)
+
+
+def _concatenate(spans_list):
+    spans = Spans(*[np.concatenate(arrays) for arrays in zip(*spans_list)])
+    order = np.lexsort((spans.starts, spans.rows, spans.ids))
+    return Spans(*[arr[order] for arr in spans])
+
+
+def polygon_spans(coordinates, offsets, ids=None):
+    """
+    Scanline fill of many polygons at once. A pixel belongs to a polygon if
+    its center lies inside (even-odd rule), as in ImageJ.
+
+    Parameters
+    -----------
+    coordinates: numpy.ndarray
+    (M, 2) x, y vertex coordinates of all polygons concatenated together.
+
+    offsets: numpy.ndarray
+    (N + 1, ) array; the vertices of polygon i are
+    coordinates[offsets[i]:offsets[i + 1]].
+
+    ids: numpy.ndarray
+    (N, ) ROI index of each polygon. Defaults to range(N).
+
+    Returns
+    -----------
+    Spans
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_vertices = np.diff(offsets)
+    if ids is None:
+        ids = np.arange(len(n_vertices))
+    ids = np.asarray(ids, dtype=np.int64)
+
+    # each vertex starts an edge to the next one; the last vertex of a
+    # polygon connects to its first
+    owners = np.repeat(ids, n_vertices)
+    following = np.arange(1, len(coordinates) + 1)
+    nonempty = n_vertices > 0
+    following[offsets[1:][nonempty] - 1] = offsets[:-1][nonempty]
+    x0, y0 = coordinates.T
+    x1, y1 = coordinates[following].T if len(coordinates) else (x0, y0)
+
+    # rows whose pixel centers an edge crosses, half-open so that each
+    # vertex is counted once; horizontal edges cross none
+    first_row = _to_pixel(np.minimum(y0, y1))
+    last_row = _to_pixel(np.maximum(y0, y1))
+    edges, rows = expand_ranges(first_row, last_row - first_row)
+    dx, dy = (x1 - x0)[edges], (y1 - y0)[edges]
+    crossings = x0[edges] + (rows + 0.5 - y0[edges]) * dx / dy
+
+    # crossings of each row of each polygon pair up into spans
+    edge_ids = owners[edges]
+    order = np.lexsort((crossings, rows, edge_ids))
+    crossings = crossings[order]
+    spans = Spans(edge_ids[order][::2], rows[order][::2],
+                  _to_pixel(crossings[::2]), _to_pixel(crossings[1::2]))
+    keep = spans.stops > spans.starts
+    return Spans(*[arr[keep] for arr in spans])
+
+
+def rect_spans(rects, ids=None):
+    """
+    Parameters
+    -----------
+    rects: numpy.ndarray
+    (N, 4) x0, y0, x1, y1 of each rectangle.
+
+    ids: numpy.ndarray
+    (N, ) ROI index of each rectangle. Defaults to range(N).
+
+    Returns
+    -----------
+    Spans
+    """
+    rects = np.asarray(rects, dtype=float).reshape((-1, 4))
+    if ids is None:
+        ids = np.arange(len(rects))
+    lower = _to_pixel(np.minimum(rects[:, :2], rects[:, 2:]))
+    upper = _to_pixel(np.maximum(rects[:, :2], rects[:, 2:]))
+    owners, rows = expand_ranges(lower[:, 1],
+                                 np.maximum(upper[:, 1] - lower[:, 1], 0))
+    spans = Spans(np.asarray(ids, dtype=np.int64)[owners], rows,
+                  lower[owners, 0], upper[owners, 0])
+    keep = spans.stops > spans.starts
+    return Spans(*[arr[keep] for arr in spans])
+
+
+def oval_spans(rects, ids=None):
+    """
+    Fill the ellipses inscribed in rects. Arguments are the same as
+    rect_spans().
+    """
+    rects = np.asarray(rects, dtype=float).reshape((-1, 4))
+    if ids is None:
+        ids = np.arange(len(rects))
+    center = (rects[:, :2] + rects[:, 2:]) / 2
+    radii = np.abs(rects[:, 2:] - rects[:, :2]) / 2
+    first_row = _to_pixel(center[:, 1] - radii[:, 1])
+    last_row = _to_pixel(center[:, 1] + radii[:, 1])
+    owners, rows = expand_ranges(first_row,
+                                 np.maximum(last_row - first_row, 0))
+    cx, (a, b) = center[owners, 0], radii[owners].T
+    # half-width of the ellipse at each row's pixel centers
+    dy = (rows + 0.5 - center[owners, 1]) / np.where(b > 0, b, 1)
+    dx = a * np.sqrt(np.clip(1 - dy**2, 0, None))
+    spans = Spans(np.asarray(ids, dtype=np.int64)[owners], rows,
+                  _to_pixel(cx - dx), _to_pixel(cx + dx))
+    keep = spans.stops > spans.starts
+    return Spans(*[arr[keep] for arr in spans])
+
+
+def rasterize(table):
+    """
+    Spans of every rectangle, oval and area ROI (polygon, freehand, traced)
+    in a roi_table.ROITable. Lines and points have no area and are skipped.
+
+    Returns
+    -----------
+    Spans
+    Sorted by ROI index, then row; ids are row indices of table.
+    """
+    types = np.asarray(table.types)
+    n_vertices = table.n_coordinates
+    polygons = np.flatnonzero(np.isin(types, FILLED_TYPES) &
+                              (n_vertices > 0))
+    # gather the polygons' vertices into their own ragged array
+    _, vertices = expand_ranges(table.offsets[:-1][polygons],
+                                n_vertices[polygons])
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum(n_vertices[polygons], out=offsets[1:])
+
+    rects = np.flatnonzero(types == ROI_TYPE['rectangle'])
+    ovals = np.flatnonzero(types == ROI_TYPE['oval'])
+    return _concatenate(
+        [_empty_spans(),
+         polygon_spans(table.coordinates[vertices], offsets, polygons),
+         rect_spans(table.bounding_rect[rects], rects),
+         oval_spans(table.bounding_rect[ovals], ovals)])
+
+
+def clip_spans(spans, lower, upper):
+    """
+    Crop spans to pixels x, y with lower <= (x, y) < upper.
+    """
+    keep = (spans.rows >= lower[1]) & (spans.rows < upper[1])
+    spans = Spans(spans.ids[keep], spans.rows[keep],
+                  np.maximum(spans.starts[keep], lower[0]),
+                  np.minimum(spans.stops[keep], upper[0]))
+    keep = spans.stops > spans.starts
+    return Spans(*[arr[keep] for arr in spans])
+
+
+def spans_to_pixels(spans):
+    """
+    Returns
+    -----------
+    ids, x, y: numpy.ndarray
+    ROI index and coordinates of every pixel in spans.
+    """
+    owners, x = expand_ranges(spans.starts, spans.stops - spans.starts)
+    return spans.ids[owners], x, spans.rows[owners]
+
+
+def label_image(spans, shape, dtype=np.int32):
+    """
+    Render spans into an image indexed image[x, y], like the slices returned
+    by BaseROI.to_slice(). Pixels are ROI index + 1, background is 0. Where
+    ROI overlap, the one with the higher index wins.
+
+    Parameters
+    -----------
+    spans: Spans
+    See rasterize().
+
+    shape: tuple of int
+    Image shape, (width, height).
+    """
+    image = np.zeros(shape, dtype=dtype)
+    ids, x, y = spans_to_pixels(clip_spans(spans, (0, 0), shape))
+    np.maximum.at(image, (x, y), (ids + 1).astype(dtype))
+    return image
+
+
+def iter_label_tiles(spans, shape, tile_shape, dtype=np.int32):
+    """
+    Render label_image() one tile at a time, for images too large to keep
+    in memory.
+
+    Yields
+    -----------
+    slices: list of slice
+    Location of the tile in the full image.
+
+    tile: numpy.ndarray
+    """
+    # sort by row once, so that each band of tiles takes a contiguous chunk
+    order = np.argsort(spans.rows, kind='stable')
+    spans = Spans(*[arr[order] for arr in spans])
+    width, height = shape
+    tile_width, tile_height = tile_shape
+    for y0 in range(0, height, tile_height):
+        y1 = min(y0 + tile_height, height)
+        lo, hi = np.searchsorted(spans.rows, [y0, y1])
+        band = Spans(*[arr[lo:hi] for arr in spans])
+        for x0 in range(0, width, tile_width):
+            x1 = min(x0 + tile_width, width)
+            tile = clip_spans(band, (x0, y0), (x1, y1))
+            tile = tile._replace(rows=tile.rows - y0,
+                                 starts=tile.starts - x0,
+                                 stops=tile.stops - x0)
+            yield ([slice(x0, x1), slice(y0, y1)],
+                   label_image(tile, (x1 - x0, y1 - y0), dtype))
+
+
+def masks(spans, n=None):
+    """
+    Boolean mask of each ROI, cropped to its own bounding box.
+
+    Parameters
+    -----------
+    spans: Spans
+
+    n: int
+    Number of ROI. Defaults to the largest ROI index in spans + 1.
+
+    Returns
+    -----------
+    list
+    For ROI i, [slices, mask] such that image[slices][mask] are its pixels,
+    or None if it contains no pixels.
+    """
+    ids, x, y = spans_to_pixels(spans)
+    if n is None:
+        n = ids.max() + 1 if len(ids) else 0
+    order = np.argsort(ids, kind='stable')
+    ids, x, y = ids[order], x[order], y[order]
+    bounds = np.searchsorted(ids, np.arange(n + 1))
+    ret = []
+    for i in range(n):
+        sl = slice(bounds[i], bounds[i+1])
+        if sl.start == sl.stop:
+            ret.append(None)
+            continue
+        xi, yi = x[sl], y[sl]
+        x0, y0 = int(xi.min()), int(yi.min())
+        mask = np.zeros((xi.max() - x0 + 1, yi.max() - y0 + 1), dtype=bool)
+        mask[xi - x0, yi - y0] = True
+        ret.append([[slice(x0, x0 + mask.shape[0]),
+                     slice(y0, y0 + mask.shape[1])], mask])
+    return ret
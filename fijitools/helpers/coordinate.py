@@ -21,39 +21,59 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import numpy as np
 import numbers
 from collections import OrderedDict
+from collections.abc import ItemsView, KeysView, ValuesView
 
 from .iteration import isiterable
 
 
 # BUG: setting values to zero gets division by zero error when getting pixelsize
+class _UnitsView(object):
+    # len(Coordinate) is the number of coordinates, not of units
+    def __len__(self):
+        return len(self._mapping._units())
+
+
+class _UnitsKeysView(_UnitsView, KeysView):
+    pass
+
+
+class _UnitsValuesView(_UnitsView, ValuesView):
+    pass
+
+
+class _UnitsItemsView(_UnitsView, ItemsView):
+    pass
+
+
 class Coordinate(dict):
+    """
+    Coordinate values in several units, e.g. px=..., nm=.... Physical sizes
+    are stored in nanometers only; 'um' and 'm' are derived on access, but
+    are listed by keys(), values(), items() and iteration like stored units.
+    """
     rtol = 1e-05
     atol = 1e-08
     _unit_conversion = OrderedDict([('nm', 1e-6), ('um', 1e-3), ('m', 1.)])
 
     def __init__(self, **kwargs):
-        intersection = np.intersect1d(kwargs.keys(),
-                                      self._unit_conversion.keys())
-        assert len(intersection) < 2, "Initializing arguments may only "
-        "contain one of {}.".format(', '.join(self._unit_conversion.keys()))
+        # physical sizes are stored only in nanometers; other units are
+        # derived on access by __missing__ and cached in self._derived
+        physical = [k for k in kwargs if k in self._unit_conversion]
+        assert len(physical) < 2, "Initializing arguments may only " \
+            "contain one of {}.".format(', '.join(self._unit_conversion))
         super().__init__()
+        self._derived = {}
 
         for k, v in kwargs.items():
             if isiterable(v):
-                kwargs[k] = np.array(v)
-
-        super().__init__(**kwargs)
-
-        keys = list(kwargs.keys())
-        ckeys = list(self._unit_conversion.keys())
-        mask = np.isin(ckeys, keys)
-        if sum(mask) > 0:
-            key = np.array(ckeys)[mask][0]
-            self._expand_units(key, kwargs[key])
+                v = np.array(v)
+            if k in self._unit_conversion:
+                k, v = 'nm', self._to_nm(k, v)
+            super().__setitem__(k, v)
 
     def __len__(self):
         try:
-            length = np.array([len(v) for v in self.values()])
+            length = np.array([len(v) for v in dict.values(self)])
             if not np.all(length[0] == length):
                 raise Exception("Lengths of members not equal.")
         except TypeError:
@@ -79,16 +99,69 @@ class Coordinate(dict):
     def __setitem__(self, unit, value):
         if self._check_iterable(value):
             value = np.array(value)
-        if unit in self._unit_conversion.keys():
-            self._expand_units(unit, value)
-        else:
-            super().__setitem__(unit, value)
+        if unit in self._unit_conversion:
+            unit, value = 'nm', self._to_nm(unit, value)
+        super().__setitem__(unit, value)
+        self._derived.clear()
+
+    def __missing__(self, unit):
+        # called by dict.__getitem__ for units that aren't stored
+        if unit in self._unit_conversion and super().__contains__('nm'):
+            try:
+                return self._derived[unit]
+            except KeyError:
+                conversion = self._unit_conversion
+                value = super().__getitem__('nm') * conversion['nm'] / \
+                    conversion[unit]
+                self._derived[unit] = value
+                return value
+        raise KeyError(unit)
+
+    def __contains__(self, unit):
+        return super().__contains__(unit) or (
+            unit in self._unit_conversion and super().__contains__('nm'))
+
+    def _units(self):
+        """
+        Stored units followed by those derived from 'nm'.
+        """
+        units = list(dict.keys(self))
+        if 'nm' in units:
+            units += [u for u in self._unit_conversion if u not in units]
+        return units
+
+    def __iter__(self):
+        return iter(self._units())
+
+    def keys(self):
+        return _UnitsKeysView(self)
+
+    def values(self):
+        return _UnitsValuesView(self)
+
+    def items(self):
+        return _UnitsItemsView(self)
+
+    def get(self, unit, default=None):
+        try:
+            return self[unit]
+        except KeyError:
+            return default
+
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
 
-    def _expand_units(self, unit, value):
-        # create values for 'm', 'um' and 'nm' units
+    def __reduce__(self):
+        # restore through __init__ so that self._derived exists before
+        # items are set
+        return self.__class__, (), None, None, iter(dict.items(self))
+
+    def _to_nm(self, unit, value):
+        if unit == 'nm':
+            return value
         conversion = self._unit_conversion
-        d = {k: value * conversion[unit] / conversion[k] for k in conversion}
-        self.update(**d)
+        return value * conversion[unit] / conversion['nm']
 
     def __call__(self, value, unit, newunit):
         """Return value given in unit in another unit."""
@@ -100,27 +173,43 @@ class Coordinate(dict):
 
     def _is_valid_operand(self, other):
         """
-        For ==, >, >=, <, <=, != comparisons.
+        For ==, >, >=, <, <=, != comparisons. Operands are comparable if
+        their pixelsizes and optical unit sizes are equal, or unknown in
+        either one.
         """
         try:
-            if self.ou_size is None and other.ou_size is None:
-                ou = True
-            if self.pixelsize is None and other.pixelsize is None:
-                ps = True
-            if ou and ps:
-                return True
-
-            if len(self) == len(other):
-                px = np.all(np.isclose(other.pixelsize, self.pixelsize),
-                            rtol=self.rtol, atol=self.atol)
-                ou = np.all(np.isclose(other.ou_size, self.ou_size),
-                            rtol=self.rtol, atol=self.atol)
-                return px and ou
-
+            sizes = [(self.pixelsize, other.pixelsize),
+                     (self.ou_size, other.ou_size)]
+        except (TypeError, AttributeError, ZeroDivisionError):
             return False
+        for mine, theirs in sizes:
+            if mine is None or theirs is None:
+                continue
+            try:
+                if not np.all(np.isclose(mine, theirs, rtol=self.rtol,
+                                         atol=self.atol)):
+                    return False
+            except TypeError:
+                return False
+        return True
 
-        except (TypeError, AttributeError):
+    def _compare(self, other, op):
+        """
+        Apply op once to the values of all units stored in both self and
+        other, stacked into single arrays.
+        """
+        if not self._is_valid_operand(other):
+            return NotImplemented
+        keys = [k for k in dict.keys(self) if k in other]
+        if not keys:
+            # no keys in common between self and other
             return False
+        mine = np.array([self[k] for k in keys])
+        theirs = np.array([other[k] for k in keys])
+        return op(mine, theirs).all(axis=0)
+
+    def _isclose(self, mine, theirs):
+        return np.isclose(mine, theirs, rtol=self.rtol, atol=self.atol)
 
     def __eq__(self, other):
         """
@@ -131,88 +220,59 @@ class Coordinate(dict):
         optical unit sizes, and comparing to anything besides Coordinate
         instances returns NotImplemented.
         """
-        if self._is_valid_operand(other):
-            compare = np.array([np.isclose(self[k], other[k],
-                                           rtol=self.rtol, atol=self.atol)
-                                for k in self if k in other])
-            if len(compare) == 0:
-                # no keys in common between self and other
-                return False
-            else:
-                return compare.all(axis=0)
-        else:
-            return NotImplemented
+        return self._compare(other, self._isclose)
+
+    def __ne__(self, other):
+        ret = self.__eq__(other)
+        if ret is NotImplemented:
+            return ret
+        return np.logical_not(ret)
 
     def __lt__(self, other):
-        if self._is_valid_operand(other):
-            compare = np.array([self[k] < other[k] for k in
-                                self.keys() if k in other.keys()])
-            if len(compare) == 0:
-                # no keys in common between self and other
-                return False
-            else:
-                return compare.all(axis=0)
-        else:
-            return NotImplemented
+        return self._compare(other, np.less)
 
     def __le__(self, other):
-        if self._is_valid_operand(other):
-            compare = np.array([self[k] <= other[k] for k in
-                                self.keys() if k in other.keys()])
-            if len(compare) == 0:
-                # no keys in common between self and other
-                return False
-            else:
-                return compare.all(axis=0)
-        else:
-            return NotImplemented
+        return self._compare(other, np.less_equal)
 
     def __gt__(self, other):
-        if self._is_valid_operand(other):
-            compare = np.array([self[k] > other[k] for k in
-                                self.keys() if k in other.keys()])
-            if len(compare) == 0:
-                # no keys in common between self and other
-                return False
-            else:
-                return compare.all(axis=0)
-        else:
-            return NotImplemented
+        return self._compare(other, np.greater)
 
     def __ge__(self, other):
-        if self._is_valid_operand(other):
-            compare = np.array([self[k] >= other[k] for k in
-                                self.keys() if k in other.keys()])
-            if len(compare) == 0:
-                # no keys in common between self and other
-                return False
-            else:
-                return compare.all(axis=0)
-        else:
-            return NotImplemented
+        return self._compare(other, np.greater_equal)
 
     def __add__(self, other):
-        other = Coordinate(**other)
-        me = Coordinate(**self)
-        try:
-            ps = me.pixelsize is not None
-            other_ps = other.pixelsize is not None
-            if ps:
-                other.pixelsize = me.pixelsize
-            elif other_ps:
-                me.pixelsize = other.pixelsize
-            kwargs = {k: self[k] + other[k] for k in
-                      me.keys() if k in other.keys()}
-            return Coordinate(**kwargs)
-        except (AttributeError, KeyError):
+        if not isinstance(other, Coordinate):
             return NotImplemented
+        # missing 'px' or 'nm' values of one operand are filled in using
+        # the other's pixelsize; only units present in both are summed
+        pixelsize = self.pixelsize
+        if pixelsize is None:
+            pixelsize = other.pixelsize
+        ret = self.__class__()
+        for k in set(dict.keys(self)) | set(dict.keys(other)):
+            a = self._stored_or_converted(k, pixelsize)
+            b = other._stored_or_converted(k, pixelsize)
+            if a is not None and b is not None:
+                dict.__setitem__(ret, k, a + b)
+        return ret
+
+    def _stored_or_converted(self, unit, pixelsize):
+        if dict.__contains__(self, unit):
+            return dict.__getitem__(self, unit)
+        elif pixelsize is None:
+            return None
+        elif unit == 'px' and dict.__contains__(self, 'nm'):
+            return dict.__getitem__(self, 'nm') / pixelsize
+        elif unit == 'nm' and dict.__contains__(self, 'px'):
+            return dict.__getitem__(self, 'px') * pixelsize
+        return None
 
     def __sub__(self, other):
         return self.__add__(-1 * other)
 
     def __mul__(self, other):
         coord = self.__class__()
-        coord.update(**{k: v * other for k, v in self.items()})
+        coord.update(**{k: v * other for k, v in dict.items(self)})
         return coord
 
     __rmul__ = __mul__
@@ -227,7 +287,7 @@ class Coordinate(dict):
     def __floordiv__(self, other):
         ret = self.__truediv__(other)
         ret.update(**{k: np.floor(v, dtype=v.dtype)
-                      for k, v in ret.items()})
+                      for k, v in dict.items(ret)})
         return ret
 
     def _ratio(self, value_1, value_2):
@@ -271,7 +331,7 @@ class Coordinate(dict):
             # 'nm', 'um', 'm' aren't set, 'px' is
             # determine the 'nm'/'um'/'m' from the
             # number of pixels and passed-in pixelsize
-            self._expand_units('nm', self['px'] * ps_nm)
+            self['nm'] = self['px'] * ps_nm
         elif sum(mask) > 0 and 'px' in self.keys():
             raise AttributeError('Pixelsize and physical sizes are both'
                                  'already set.')
@@ -286,3 +346,178 @@ class Coordinate(dict):
     @ou_size.setter
     def ou_size(self, *args):
         pass
+
+
+class CoordinateArray(object):
+    """
+    Many x, y coordinates sharing one pixelsize. Values are stored once, as
+    an (N, 2) array in pixels; physical units are computed on first access
+    and cached until the pixelsize changes. Compared with a list of
+    Coordinate, this avoids creating one dictionary and several small arrays
+    per point.
+
+    Parameters
+    -----------
+    px: array-like
+    (N, 2) x, y coordinates in pixels. Not copied if already a numpy array.
+
+    pixelsize: float, array-like, str or Coordinate
+    Size of a pixel in nanometers, either one value or one per axis. If a
+    Coordinate, its 'nm' value is used.
+    """
+    _unit_conversion = Coordinate._unit_conversion
+
+    def __init__(self, px, pixelsize=None):
+        px = np.asarray(px)
+        if px.dtype.kind not in 'fc':
+            px = px.astype(float)
+        self.px = px.reshape((-1, 2))
+        self._cache = {}
+        self.pixelsize = pixelsize
+
+    @classmethod
+    def from_coordinates(cls, coordinates):
+        """
+        Create from an iterable of Coordinate, each of which has a 'px' key.
+        Raises an AttributeError if the Coordinates' pixelsizes differ.
+        """
+        coordinates = list(coordinates)
+        px = np.array([c['px'] for c in coordinates], dtype=float)
+        pixelsizes = [c.pixelsize for c in coordinates
+                      if c.pixelsize is not None]
+        pixelsize = None
+        if pixelsizes:
+            pixelsize = pixelsizes[0]
+            if not all(np.allclose(p, pixelsize, rtol=Coordinate.rtol,
+                                   atol=Coordinate.atol)
+                       for p in pixelsizes[1:]):
+                raise AttributeError('Not all pixelsizes are equal.')
+        return cls(px, pixelsize)
+
+    @property
+    def pixelsize(self):
+        return self._pixelsize
+
+    @pixelsize.setter
+    def pixelsize(self, ps):
+        if isinstance(ps, Coordinate):
+            ps = ps['nm']
+        if ps is not None:
+            ps = np.asarray(ps, dtype=float)
+        self._pixelsize = ps
+        self._cache.clear()
+
+    def keys(self):
+        if self._pixelsize is None:
+            return ['px']
+        return ['px'] + list(self._unit_conversion.keys())
+
+    def __contains__(self, unit):
+        return unit in self.keys()
+
+    def __len__(self):
+        return len(self.px)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.px, dtype=dtype)
+
+    def __getitem__(self, key):
+        """
+        A unit string returns an (N, 2) array in that unit. An integer
+        returns the Coordinate of that point, and a slice or index array a
+        CoordinateArray of those points.
+        """
+        if isinstance(key, str):
+            return self._get_unit(key)
+        elif isinstance(key, numbers.Integral):
+            px = self.px[key]
+            if self._pixelsize is None:
+                return Coordinate(px=px)
+            return Coordinate(px=px, nm=self._get_unit('nm')[key])
+        else:
+            return self.__class__(self.px[key], self._pixelsize)
+
+    def _get_unit(self, unit):
+        if unit == 'px':
+            return self.px
+        try:
+            return self._cache[unit]
+        except KeyError:
+            pass
+        if unit not in self._unit_conversion:
+            raise KeyError(unit)
+        elif self._pixelsize is None:
+            raise KeyError('{} unavailable; pixelsize is not set.'.format(
+                unit))
+        conversion = self._unit_conversion
+        value = self.px * (self._pixelsize * (conversion['nm'] /
+                                              conversion[unit]))
+        self._cache[unit] = value
+        return value
+
+    def _operands(self, other):
+        """
+        Values of self and other in a unit both have: pixels if other has
+        them, else nanometers.
+        """
+        if not isinstance(other, (Coordinate, CoordinateArray)):
+            other = Coordinate(px=other)
+        if 'px' in other:
+            return self.px, np.asarray(other['px'])
+        elif 'nm' in other and 'nm' in self:
+            return self['nm'], np.asarray(other['nm'])
+        raise KeyError('No unit in common.')
+
+    def _compare(self, other, op):
+        """
+        Compare every point to other, which may be a Coordinate, a
+        CoordinateArray of the same length or an x, y pair in pixels, with a
+        single call to op. Returns an (N, ) boolean array that is True where
+        op holds for both x and y.
+        """
+        try:
+            mine, theirs = self._operands(other)
+        except (KeyError, TypeError):
+            return NotImplemented
+        return op(mine, theirs).all(axis=-1)
+
+    def isclose(self, other):
+        return self._compare(other, lambda a, b: np.isclose(
+            a, b, rtol=Coordinate.rtol, atol=Coordinate.atol))
+
+    def __eq__(self, other):
+        return self.isclose(other)
+
+    def __lt__(self, other):
+        return self._compare(other, np.less)
+
+    def __le__(self, other):
+        return self._compare(other, np.less_equal)
+
+    def __gt__(self, other):
+        return self._compare(other, np.greater)
+
+    def __ge__(self, other):
+        return self._compare(other, np.greater_equal)
+
+    def within(self, lower, upper):
+        """
+        (N, ) boolean array, True for points inside the box spanned by lower
+        and upper, boundaries included. lower and upper may be Coordinates
+        or x, y pairs in pixels.
+
+        Example
+        -----------
+        >>> inside = table.centroids.within((0, 0), (512, 512))
+        """
+        mine, low = self._operands(lower)
+        high = self._operands(upper)[1]
+        return ((mine >= low) & (mine <= high)).all(axis=-1)
+
+    def __repr__(self):
+        return '{}(px={!r}, pixelsize={!r})'.format(
+            self.__class__.__name__, self.px, self._pixelsize)
@@ -24,13 +24,34 @@ import h5py
 import weakref
 from addict import Dict
 from collections import OrderedDict
+from collections.abc import ItemsView, ValuesView
 import datetime
 import json
-from struct import pack
+import re
 
 from .iteration import isiterable
 
 
+class LazyValue(object):
+    """
+    Placeholder for a value that is expensive to compute. IndexedDict
+    replaces it with the result of func(*args) the first time it is
+    accessed.
+    """
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __repr__(self):
+        return '<LazyValue {}{}>'.format(
+            getattr(self.func, '__name__', self.func), self.args)
+
+    def resolve(self):
+        return self.func(*self.args)
+
+
 class IndexedDict(Dict):
     """
     Allows setting and getting keys/values by passing in the key index. 
@@ -42,7 +63,31 @@ class IndexedDict(Dict):
     >>> d.iloc(slice(1), [None])
     >>> d
     {'a': None}
+
+    Values may be LazyValue placeholders, which are resolved and cached the
+    first time they are accessed.
     """
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, LazyValue):
+            value = value.resolve()
+            # bypass addict's parent bookkeeping; the key already exists
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        # like dict.values(), a live view; values are looked up with
+        # self[key] as they are iterated over, resolving LazyValue
+        return ValuesView(self)
+
+    def items(self):
+        return ItemsView(self)
+
     def _get_with_int(self, key, value):
         return self[key]
 
@@ -203,24 +248,56 @@ class NestedDict(dict):
 
 class RoiPropsDict(OrderedDict):
     """
+    ROI properties, stored by ImageJ as "key: value" lines at the end of the
+    ROI bytestream.
     """
+    # "key: value" lines; lines with more or fewer than one ': ' separator
+    # are ignored
+    _regexp = re.compile(r'^((?:(?!: ).)*): ((?:(?!: ).)*)$', re.MULTILINE)
+
     def __init__(self, string='', *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # ugly workaround for when the last character of
-        # string.split(r'\n') is '' because the string ends in r'\n'.
-        # This is common (always the case?) for ImageJ ROI.
         if string:
-            if string[:-1] == '\n':
-                string = string[:-1]
-            kv = [pair.split(': ') for pair in string.split('\n')
-                  if len(pair.split(': ')) == 2]
-            self.update(kv)
+            # one regular expression pass over the whole string
+            self.update(self._regexp.findall(string))
             self.string = string
 
-            # self.update(OrderedDict([(item.split(': ')[0], item.split(': ')[1])
-            #                          for item in string.split('\n')]))
+    @classmethod
+    def from_strings(cls, strings):
+        """
+        Parse ROI properties of many ROI.
+
+        Arguments
+        -----------
+        strings: iterable of str
+
+        Returns
+        -----------
+        list of RoiPropsDict
+        """
+        strings = list(strings)
+        ret = [cls() for _ in strings]
+        # one regular expression pass over all strings, joined by newlines
+        # so that no line spans two strings; each match is then assigned to
+        # the string it starts in
+        starts = np.cumsum([0] + [len(s) + 1 for s in strings[:-1]])
+        matches = list(cls._regexp.finditer('\n'.join(strings)))
+        owners = np.searchsorted(starts, [m.start() for m in matches],
+                                 side='right') - 1
+        for i, m in zip(owners.tolist(), matches):
+            ret[i][m.group(1)] = m.group(2)
+        for props, s in zip(ret, strings):
+            if s:
+                props.string = s
+        return ret
 
     def to_IJ(self, image_name=''):
+        """
+        ROI properties encoded as UTF-16BE, the way ImageJ stores them.
+        """
+        return self.to_string(image_name).encode('utf-16-be')
+
+    def to_string(self, image_name=''):
         """
         "{}: {}\n" format allows ImageJ to parse ROI properties and store them
         as a java.utils.Properties object.
@@ -238,8 +315,7 @@ class RoiPropsDict(OrderedDict):
         add += image_name
 
         li = ["{}: {}".format(k, v) for k, v in self.items()]
-        as_string = '\n'.join(map(str, li)) + '\n' + add
-        return pack('>' + 'h'*len(as_string), *tuple(map(ord, as_string)))
+        return '\n'.join(map(str, li)) + '\n' + add
 
     def to_JSON(self, image_name=''):
         if image_name:
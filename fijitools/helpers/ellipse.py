@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*- 
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+
+def ellipse_vertices(center, axes, angle, n_vertices=72):
+    """
+    Vertices of many ellipses in one broadcast operation.
+
+    Parameters
+    -----------
+    center: array-like
+    (N, 2) x, y of each ellipse's center.
+
+    axes: array-like
+    (N, 2) semi-major and semi-minor axis lengths.
+
+    angle: array-like
+    (N, ) angle of the major axis from the x axis, in radians.
+
+    n_vertices: int
+
+    Returns
+    -----------
+    numpy.ndarray
+    (N, n_vertices, 2) x, y coordinates.
+    """
+    center = np.asarray(center, dtype=float).reshape((-1, 2))
+    axes = np.asarray(axes, dtype=float).reshape((-1, 2))
+    angle = np.asarray(angle, dtype=float).reshape((-1, 1))
+    t = np.linspace(0, 2*np.pi, n_vertices, endpoint=False)
+    # (N, n_vertices) coordinates along the major and minor axes
+    u = axes[:, :1] * np.cos(t)
+    v = axes[:, 1:] * np.sin(t)
+    cos, sin = np.cos(angle), np.sin(angle)
+    return np.stack([center[:, :1] + u*cos - v*sin,
+                     center[:, 1:] + u*sin + v*cos], axis=-1)
+
+
+def _conic_to_params(conic):
+    """
+    Center, semi-axes and angle of ellipses given as (N, 6) coefficients of
+    A x^2 + B xy + C y^2 + D x + E y + F = 0.
+    """
+    # the coefficients' overall sign is arbitrary; fix it so that the
+    # formulas below give the major axis first
+    conic = conic * np.where(conic[:, 0] + conic[:, 2] < 0, -1, 1)[:, None]
+    A, B, C, D, E, F = conic.T
+    disc = B**2 - 4*A*C
+    center = np.stack([(2*C*D - B*E) / disc, (2*A*E - B*D) / disc], axis=1)
+    root = np.hypot(A - C, B)
+    num = 2 * (A*E**2 + C*D**2 - B*D*E + disc*F)
+    with np.errstate(invalid='ignore'):
+        major = -np.sqrt(num * (A + C + root)) / disc
+        minor = -np.sqrt(num * (A + C - root)) / disc
+    angle = 0.5 * np.arctan2(-B, C - A)
+    return center, np.stack([major, minor], axis=1), angle
+
+
+def fit_ellipses(coordinates, offsets):
+    """
+    Direct least squares fit of an ellipse to each of many point sets
+    (Fitzgibbon et al., 1999, in the numerically stable form of Halir and
+    Flusser, 1998). Scatter matrices of all sets are summed with one
+    np.add.reduceat call, and the eigenproblems are solved as one stack.
+
+    Parameters
+    -----------
+    coordinates: numpy.ndarray
+    (M, 2) x, y coordinates of all point sets concatenated together.
+
+    offsets: numpy.ndarray
+    (N + 1, ) array; set i is coordinates[offsets[i]:offsets[i + 1]].
+
+    Returns
+    -----------
+    center: numpy.ndarray
+    (N, 2) x, y.
+
+    axes: numpy.ndarray
+    (N, 2) semi-major and semi-minor axis lengths.
+
+    angle: numpy.ndarray
+    (N, ) angle of the major axis from the x axis, in radians, in
+    (-pi / 2, pi / 2].
+
+    Sets of fewer than 5 points, of collinear points, or that no ellipse
+    fits, are NaN.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = np.diff(offsets)
+    owners = np.repeat(np.arange(len(n)), n)
+    valid = n >= 5
+    center = np.full((len(n), 2), np.nan)
+    axes = np.full((len(n), 2), np.nan)
+    angle = np.full(len(n), np.nan)
+    if not np.any(valid):
+        return center, axes, angle
+
+    # center and scale each set for numerical stability
+    starts = np.concatenate([[0], np.cumsum(n[valid])[:-1]])
+    sets = (np.cumsum(valid) - 1)[owners[valid[owners]]]
+    xy = coordinates[valid[owners]]
+    mean = np.add.reduceat(xy, starts) / n[valid, None]
+    xy = xy - mean[sets]
+    scale = np.sqrt(np.add.reduceat((xy**2).sum(axis=1), starts) /
+                    n[valid])
+    scale[scale == 0] = 1.
+    xy /= scale[sets, None]
+    x, y = xy.T
+    D1 = np.stack([x*x, x*y, y*y], axis=1)
+    D2 = np.stack([x, y, np.ones_like(x)], axis=1)
+    S1 = np.add.reduceat(D1[:, :, None] * D1[:, None, :], starts)
+    S2 = np.add.reduceat(D1[:, :, None] * D2[:, None, :], starts)
+    S3 = np.add.reduceat(D2[:, :, None] * D2[:, None, :], starts)
+    # S3 is singular if a set's points are collinear; leave those NaN rather
+    # than failing the whole batch
+    well = np.linalg.cond(S3) < 1 / np.finfo(float).eps
+    if not np.any(well):
+        return center, axes, angle
+    S1, S2, S3 = S1[well], S2[well], S3[well]
+    mean, scale = mean[well], scale[well]
+    valid[valid] = well
+    T = -np.linalg.solve(S3, np.swapaxes(S2, 1, 2))
+    M = S1 + S2 @ T
+    # premultiply by the inverse of the constraint matrix
+    M = np.stack([M[:, 2] / 2, -M[:, 1], M[:, 0] / 2], axis=1)
+    _, vectors = np.linalg.eig(M)
+    vectors = vectors.real
+    # the ellipse is the eigenvector with 4ac - b^2 > 0
+    constraint = 4 * vectors[:, 0] * vectors[:, 2] - vectors[:, 1]**2
+    choice = np.argmax(constraint > 0, axis=1)
+    found = np.any(constraint > 0, axis=1)
+    a1 = vectors[np.arange(len(vectors)), :, choice]
+    a2 = (T @ a1[:, :, None])[:, :, 0]
+    c, ax, an = _conic_to_params(np.hstack([a1, a2]))
+    c = c * scale[:, None] + mean
+    ax = ax * scale[:, None]
+    c[~found], ax[~found], an[~found] = np.nan, np.nan, np.nan
+    center[valid], axes[valid], angle[valid] = c, ax, an
+    return center, axes, angle
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*- 
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy as np
+from scipy.interpolate import splev, splprep
+
+from .iteration import expand_ranges
+
+
+def _close(coordinates, offsets, closed):
+    """
+    Append each closed curve's first vertex to its end.
+
+    Returns
+    -----------
+    owners: numpy.ndarray
+    Curve index of each vertex of the result.
+
+    coordinates, offsets: numpy.ndarray
+    """
+    n = np.diff(offsets)
+    closed = np.broadcast_to(closed, n.shape) & (n > 1)
+    n_closed = n + closed
+    owners, local = expand_ranges(np.zeros(len(n), np.int64), n_closed)
+    vertices = offsets[:-1][owners] + local % np.maximum(n, 1)[owners]
+    new_offsets = np.zeros(len(n) + 1, dtype=np.int64)
+    np.cumsum(n_closed, out=new_offsets[1:])
+    return owners, coordinates[vertices], new_offsets
+
+
+def neighbours(offsets, closed=False):
+    """
+    Index of the previous and next vertex of every vertex of many curves,
+    within its own curve. Open curves repeat their end vertices; closed
+    curves wrap around.
+
+    Parameters
+    -----------
+    offsets: numpy.ndarray
+    (N + 1, ) array; curve i is vertices offsets[i]:offsets[i + 1].
+
+    closed: bool or numpy.ndarray
+
+    Returns
+    -----------
+    previous, following: numpy.ndarray
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = np.diff(offsets)
+    owners = np.repeat(np.arange(len(n)), n)
+    i = np.arange(offsets[-1])
+    first, last = offsets[:-1][owners], offsets[1:][owners] - 1
+    wrap = np.broadcast_to(closed, n.shape)[owners]
+    previous = np.where(i > first, i - 1, np.where(wrap, last, i))
+    following = np.where(i < last, i + 1, np.where(wrap, first, i))
+    return previous, following
+
+
+def curvature_many(coordinates, offsets, closed=False):
+    """
+    Curvature at every vertex of many curves: the reciprocal radius of the
+    circle through a vertex and its two neighbours, 4 * area / (a * b * c)
+    with the triangle's area from Heron's formula.
+
+    Parameters
+    -----------
+    coordinates: numpy.ndarray
+    (M, 2) vertices of all curves concatenated together.
+
+    offsets: numpy.ndarray
+    (N + 1, ) array; see resample_many().
+
+    closed: bool or numpy.ndarray
+
+    Returns
+    -----------
+    numpy.ndarray
+    (M, ) curvature, 0 at the ends of open curves and where vertices
+    coincide.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    previous, following = neighbours(offsets, closed)
+    # side lengths of the triangle
+    a = np.hypot(*(coordinates - coordinates[previous]).T)
+    b = np.hypot(*(coordinates[following] - coordinates).T)
+    c = np.hypot(*(coordinates[following] - coordinates[previous]).T)
+    p = (a + b + c) / 2.
+    area = np.sqrt(np.clip(p * (p - a) * (p - b) * (p - c), 0, None))
+    product = a * b * c
+    return np.divide(4. * area, product, out=np.zeros_like(product),
+                     where=product > 0)
+
+
+def max_thickness_many(coordinates, offsets, closed=False):
+    """
+    The most each curve can be widened on either side before the widened
+    line folds over itself: the smallest radius of curvature along it.
+
+    Returns
+    -----------
+    numpy.ndarray
+    (N, ) radius; inf for straight or empty curves.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    curvature = curvature_many(coordinates, offsets, closed)
+    nonempty = np.diff(offsets) > 0
+    largest = np.zeros(len(offsets) - 1)
+    if len(curvature):
+        largest[nonempty] = np.maximum.reduceat(curvature,
+                                                offsets[:-1][nonempty])
+    with np.errstate(divide='ignore'):
+        return 1. / largest
+
+
+def resample_many(coordinates, offsets, spacing=0.5, closed=False):
+    """
+    Resample many piecewise linear curves at once to equally spaced points.
+    Arc length is computed with one cumsum over all curves, and samples are
+    located with one searchsorted call.
+
+    Parameters
+    -----------
+    coordinates: numpy.ndarray
+    (M, 2) vertices of all curves concatenated together.
+
+    offsets: numpy.ndarray
+    (N + 1, ) array; the vertices of curve i are
+    coordinates[offsets[i]:offsets[i + 1]].
+
+    spacing: float
+    Maximum distance between samples along the curve. The actual spacing
+    of each curve is its length divided by a whole number.
+
+    closed: bool or numpy.ndarray
+    Whether the curves, or each curve, connect back to their first vertex.
+    Closed curves don't repeat their first sample at the end.
+
+    Returns
+    -----------
+    coordinates, offsets: numpy.ndarray
+    Samples, in the same format as the arguments.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    closed = np.broadcast_to(closed, (len(offsets) - 1, )) & \
+        (np.diff(offsets) > 1)
+    owners, points, offsets = _close(coordinates, offsets, closed)
+    n = np.diff(offsets)
+    nonempty = n > 0
+    first, last = offsets[:-1], offsets[1:] - 1
+
+    # arc length along all curves, which doesn't increase between curves
+    steps = np.hypot(*np.diff(points, axis=0).T)
+    steps[owners[1:] != owners[:-1]] = 0
+    arc = np.concatenate([[0.], np.cumsum(steps)])
+    base = np.zeros(len(n))
+    base[nonempty] = arc[first[nonempty]]
+    length = np.zeros(len(n))
+    length[nonempty] = arc[last[nonempty]] - base[nonempty]
+
+    intervals = np.maximum(np.ceil(length / spacing), 1).astype(np.int64)
+    n_samples = np.where(length > 0, intervals + ~closed, 1)
+    n_samples[~nonempty] = 0
+    curves, j = expand_ranges(np.zeros(len(n), np.int64), n_samples)
+    targets = base[curves] + length[curves] * j / intervals[curves]
+
+    # segment each sample falls on
+    segment = np.searchsorted(arc, targets, side='right') - 1
+    segment = np.clip(segment, first[curves],
+                      np.maximum(last[curves] - 1, first[curves]))
+    following = np.minimum(segment + 1, last[curves])
+    step = arc[following] - arc[segment]
+    fraction = np.divide(targets - arc[segment], step,
+                         out=np.zeros_like(step), where=step > 0)
+    samples = points[segment] + fraction[:, None] * \
+        (points[following] - points[segment])
+    new_offsets = np.zeros(len(n) + 1, dtype=np.int64)
+    np.cumsum(n_samples, out=new_offsets[1:])
+    return samples, new_offsets
+
+
+def resample(points, spacing=0.5, closed=False):
+    """
+    Resample one piecewise linear curve, given as (n, 2) points, to equally
+    spaced points. See resample_many().
+    """
+    points = np.asarray(points, dtype=float).reshape((-1, 2))
+    return resample_many(points, [0, len(points)], spacing, closed)[0]
+
+
+def spline(points, spacing=0.5, closed=False, k=3):
+    """
+    Fit an interpolating B-spline through (n, 2) points and sample it at
+    equal arc length intervals.
+
+    Parameters
+    -----------
+    points: numpy.ndarray
+
+    spacing: float
+    See resample_many().
+
+    closed: bool
+    Fit a periodic spline.
+
+    k: int
+    Spline degree, lowered if there are too few points.
+
+    Returns
+    -----------
+    numpy.ndarray
+    """
+    points = np.asarray(points, dtype=float).reshape((-1, 2))
+    # repeated points would give segments of zero parameter length
+    keep = np.concatenate([[True], np.any(np.diff(points, axis=0), axis=1)])
+    points = points[keep]
+    if closed and len(points) > 1 and np.all(points[0] == points[-1]):
+        points = points[:-1]
+    k = min(k, len(points) - 1)
+    if k < 1:
+        return resample(points, spacing, closed)
+    if closed:
+        points = np.vstack([points, points[:1]])
+
+    tck, _ = splprep(points.T, k=k, s=0, per=int(closed))
+    # evaluate densely enough that the resampled spline's chords are short
+    length = np.hypot(*np.diff(points, axis=0).T).sum()
+    m = 4 * int(np.ceil(length / spacing)) + 1
+    dense = np.stack(splev(np.linspace(0, 1, m), tck), axis=1)
+    samples = resample(dense, spacing, False)
+    return samples[:-1] if closed else samples
+
+
+def _cross_terms(coordinates, offsets):
+    """
+    For every edge of many closed polygons, the polygon index, the edge's
+    start and end vertices and their cross product x0 * y1 - x1 * y0.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    owners = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    _, following = neighbours(offsets, True)
+    start, end = coordinates, coordinates[following]
+    cross = start[:, 0] * end[:, 1] - end[:, 0] * start[:, 1]
+    return owners, start, end, cross
+
+
+def signed_area_many(coordinates, offsets):
+    """
+    Shoelace formula area of many polygons; positive if vertices go
+    counterclockwise in x right, y up coordinates.
+
+    Parameters
+    -----------
+    coordinates: numpy.ndarray
+    (M, 2) vertices of all polygons concatenated together.
+
+    offsets: numpy.ndarray
+    (N + 1, ) array; see resample_many().
+
+    Returns
+    -----------
+    numpy.ndarray
+    (N, ) areas.
+    """
+    owners, _, _, cross = _cross_terms(coordinates, offsets)
+    return np.bincount(owners, weights=cross,
+                       minlength=len(offsets) - 1) / 2.
+
+
+def area_many(coordinates, offsets):
+    return np.abs(signed_area_many(coordinates, offsets))
+
+
+def perimeter_many(coordinates, offsets, closed=True):
+    """
+    Length of the outline of many polygons, or of many lines if not closed.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    owners = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    _, following = neighbours(offsets, closed)
+    steps = np.hypot(*(coordinates[following] - coordinates).T)
+    return np.bincount(owners, weights=steps, minlength=len(offsets) - 1)
+
+
+def centroid_many(coordinates, offsets):
+    """
+    Centroid of the area enclosed by each of many polygons. Polygons with no
+    area get the mean of their vertices; empty ones NaN.
+
+    Returns
+    -----------
+    numpy.ndarray
+    (N, 2) x, y.
+    """
+    owners, start, end, cross = _cross_terms(coordinates, offsets)
+    n = len(offsets) - 1
+    area = np.bincount(owners, weights=cross, minlength=n) / 2.
+    moments = np.stack(
+        [np.bincount(owners, weights=(start[:, k] + end[:, k]) * cross,
+                     minlength=n) for k in range(2)], axis=1)
+    count = np.bincount(owners, minlength=n)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.stack([np.bincount(owners, weights=start[:, k],
+                                     minlength=n) for k in range(2)],
+                        axis=1) / count
+        return np.where(area[:, None] != 0, moments / (6. * area[:, None]),
+                        mean)
+
+
+def _convex_chain(points, owners, sign):
+    """
+    Indices of the lower (sign 1) or upper (sign -1) convex chain of each
+    set of points, sorted by x then y. Vertices that don't turn
+    counterclockwise (sign 1) or clockwise (sign -1) between their
+    neighbours lie on or beyond a chord of their set, so can't be on the
+    chain; they are removed from every set at once until none are left.
+    """
+    keep = np.arange(len(points))
+    while len(keep) > 2:
+        o, p = owners[keep], points[keep]
+        d = np.diff(p, axis=0)
+        cross = np.zeros(len(keep))
+        cross[1:-1] = d[:-1, 0] * d[1:, 1] - d[:-1, 1] * d[1:, 0]
+        # each set's first and last points are always on the chain
+        interior = np.zeros(len(keep), dtype=bool)
+        interior[1:-1] = (o[1:-1] == o[:-2]) & (o[1:-1] == o[2:])
+        drop = interior & (sign * cross <= 0)
+        if not np.any(drop):
+            break
+        keep = keep[~drop]
+    return keep
+
+
+def convex_hull_many(coordinates, offsets):
+    """
+    Convex hull of each of many point sets, vertices counterclockwise in x
+    right, y up coordinates, starting with the lowest x. Computed for all
+    sets at once with Andrew's monotone chain algorithm: points are sorted
+    by set, x and y, and the lower and upper chains of every set are found
+    together. Collinear sets are returned as their two end points, and
+    duplicate points are removed.
+
+    Returns
+    -----------
+    coordinates, offsets: numpy.ndarray
+    Hull vertices, in the same format as the arguments.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = np.diff(offsets)
+    owners = np.repeat(np.arange(len(n)), n)
+    order = np.lexsort((coordinates[:, 1], coordinates[:, 0], owners))
+    points, owners = coordinates[order], owners[order]
+    unique = np.ones(len(points), dtype=bool)
+    unique[1:] = (owners[1:] != owners[:-1]) | \
+        np.any(points[1:] != points[:-1], axis=1)
+    points, owners = points[unique], owners[unique]
+
+    lower = _convex_chain(points, owners, 1)
+    upper = _convex_chain(points, owners, -1)
+    # the upper chain's end points are already in the lower chain
+    o = owners[upper]
+    interior = np.zeros(len(upper), dtype=bool)
+    interior[1:-1] = (o[1:-1] == o[:-2]) & (o[1:-1] == o[2:])
+    upper = upper[interior]
+    # lower chain left to right, then upper chain right to left
+    vertices = np.concatenate([lower, upper])
+    section = np.repeat([0, 1], [len(lower), len(upper)])
+    key = np.where(section == 0, vertices, -vertices)
+    vertices = vertices[np.lexsort((key, section, owners[vertices]))]
+
+    hull_offsets = np.zeros(len(n) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners[vertices], minlength=len(n)),
+              out=hull_offsets[1:])
+    return points[vertices], hull_offsets
+
+
+def feret_many(coordinates, offsets):
+    """
+    Feret diameters of many point sets, computed on their convex hulls with
+    rotating calipers for all sets at once. Memory use is linear in the
+    number of hull vertices.
+
+    Returns
+    -----------
+    feret: numpy.ndarray
+    (N, ) largest distance between any two points.
+
+    min_feret: numpy.ndarray
+    (N, ) smallest width between two parallel lines enclosing the set.
+
+    angle: numpy.ndarray
+    (N, ) angle of the largest diameter from the x axis, in degrees from 0
+    to 180, as in FIJI.
+
+    Empty sets are NaN.
+    """
+    hull, offsets = convex_hull_many(coordinates, offsets)
+    n = np.diff(offsets)
+    feret = np.full(len(n), np.nan)
+    min_feret = np.full(len(n), np.nan)
+    angle = np.full(len(n), np.nan)
+
+    # single points and segments have no width
+    small = np.flatnonzero((n > 0) & (n < 3))
+    delta = hull[offsets[small] + n[small] - 1] - hull[offsets[small]]
+    feret[small] = np.hypot(*delta.T)
+    min_feret[small] = 0.
+    angle[small] = np.degrees(np.arctan2(-delta[:, 1], delta[:, 0])) % 180.
+
+    sets = np.flatnonzero(n >= 3)
+    if not len(sets):
+        return feret, min_feret, angle
+    # one row per hull edge, from vertex i to vertex i1
+    owners, local = expand_ranges(np.zeros(len(sets), np.int64), n[sets])
+    base, m = offsets[sets][owners], n[sets][owners]
+    i, i1 = base + local, base + (local + 1) % m
+    edge = hull[i1] - hull[i]
+    length = np.hypot(*edge.T)
+
+    def height(t):
+        # distance of the vertex t places after i from the edge's line
+        delta = hull[base + (local + t) % m] - hull[i]
+        return np.abs(edge[:, 0] * delta[:, 1] -
+                      edge[:, 1] * delta[:, 0]) / length
+
+    # hull vertices are strictly convex, so their distance from an edge
+    # rises to a maximum and then falls; binary search for the farthest
+    lo, hi = np.ones_like(m), m - 1
+    while np.any(lo < hi):
+        mid = (lo + hi) // 2
+        past = (mid >= m - 1) | (height(np.minimum(mid + 1, m - 1)) <=
+                                 height(mid))
+        active = lo < hi
+        hi = np.where(active & past, mid, hi)
+        lo = np.where(active & ~past, mid + 1, lo)
+    edge_starts = np.cumsum(n[sets]) - n[sets]
+    min_feret[sets] = np.minimum.reduceat(height(lo), edge_starts)
+
+    # the diameter joins an end of some edge to its farthest vertex, or to
+    # the vertex after that if it is as far, i.e. on a parallel edge
+    j, j1 = base + (local + lo) % m, base + (local + lo + 1) % m
+    first = np.stack([i, i1, i, i1], axis=1).ravel()
+    second = np.stack([j, j, j1, j1], axis=1).ravel()
+    delta = hull[second] - hull[first]
+    distance = np.hypot(*delta.T)
+    feret[sets] = np.maximum.reduceat(distance, 4 * edge_starts)
+    # first pair of each set at the largest distance
+    pair_owners = np.repeat(sets[owners], 4)
+    largest = np.flatnonzero(distance == feret[pair_owners])
+    largest = largest[np.unique(pair_owners[largest], return_index=True)[1]]
+    dx, dy = delta[largest].T
+    angle[sets] = np.degrees(np.arctan2(-dy, dx)) % 180.
+    return feret, min_feret, angle
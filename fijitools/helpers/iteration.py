@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import numpy as np
 from six import string_types
 from typing import Any, Generator, Iterable, Iterator, List
 
@@ -21,3 +22,24 @@ def current_and_next(iterable: Iterable[Any],
     for next_ in iterator:
         yield missed[0], next_
         missed = missed[1:] + [next_]
+
+
+def expand_ranges(starts: Iterable[int],
+                  counts: Iterable[int]):
+    """
+    Concatenate range(starts[i], starts[i] + counts[i]) for every i without
+    a Python loop.
+
+    Returns
+    -----------
+    owners: numpy.ndarray
+    Index i of the range each value came from.
+
+    values: numpy.ndarray
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    values = np.arange(counts.sum(), dtype=np.int64) - \
+        np.repeat(first, counts) + np.repeat(starts, counts)
+    return owners, values
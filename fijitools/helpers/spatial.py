@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*- 
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+from .geometry import area_many, neighbours
+from .iteration import expand_ranges
+
+
+class GridIndex(object):
+    """
+    Uniform grid spatial index over axis-aligned boxes, e.g. ROI bounding
+    rectangles. Each grid cell lists the boxes that overlap it; lists are
+    stored back to back in one array (compressed sparse row format), so
+    construction and batched queries are vectorized.
+
+    Parameters
+    -----------
+    boxes: array-like
+    (N, 4) x0, y0, x1, y1 of each box, in pixels. Boundaries are inclusive.
+
+    cell_size: float
+    Side length of a grid cell. By default, the larger of the median box
+    side and the side of a cell that would hold one box on average.
+    """
+
+    def __init__(self, boxes, cell_size=None):
+        boxes = np.asarray(boxes, dtype=float).reshape((-1, 4))
+        lower = np.minimum(boxes[:, :2], boxes[:, 2:])
+        upper = np.maximum(boxes[:, :2], boxes[:, 2:])
+        self.boxes = np.hstack([lower, upper])
+        if cell_size is None:
+            cell_size = self.default_cell_size(self.boxes)
+        self.cell_size = float(cell_size)
+
+        if len(boxes):
+            self.origin = lower.min(axis=0)
+            self.shape = self._cell_of(upper.max(axis=0)) + 1
+        else:
+            self.origin = np.zeros(2)
+            self.shape = np.zeros(2, dtype=np.int64)
+
+        owners, cells = self._cells_in(self._cell_of(lower),
+                                       self._cell_of(upper))
+        order = np.argsort(cells, kind='stable')
+        self._ids = owners[order]
+        self._indptr = np.zeros(np.prod(self.shape) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=np.prod(self.shape)),
+                  out=self._indptr[1:])
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @staticmethod
+    def default_cell_size(boxes):
+        boxes = np.asarray(boxes, dtype=float).reshape((-1, 4))
+        if not len(boxes):
+            return 1.
+        sides = np.abs(boxes[:, 2:] - boxes[:, :2])
+        extent = boxes[:, 2:].max(axis=0) - boxes[:, :2].min(axis=0)
+        per_box = np.sqrt(np.prod(extent) / len(boxes))
+        return max(np.median(sides.max(axis=1)), per_box, 1.)
+
+    def _cell_of(self, xy):
+        return np.floor((xy - self.origin) / self.cell_size).astype(np.int64)
+
+    def _cells_in(self, first, last):
+        """
+        Flat indices of the grid cells from first to last cell (inclusive)
+        of each of the rows in first and last, clipped to the grid.
+
+        Returns
+        -----------
+        owners: numpy.ndarray
+        Row of first and last each cell belongs to.
+
+        cells: numpy.ndarray
+        """
+        inside = np.all((last >= 0) & (first < self.shape), axis=1)
+        rows = np.flatnonzero(inside)
+        first = np.clip(first[inside], 0, self.shape - 1)
+        last = np.clip(last[inside], 0, self.shape - 1)
+        width = last[:, 0] - first[:, 0] + 1
+        height = last[:, 1] - first[:, 1] + 1
+        owners, local = expand_ranges(np.zeros(len(rows), np.int64),
+                                       width * height)
+        h = height[owners]
+        x = first[owners, 0] + local // h
+        y = first[owners, 1] + local % h
+        return rows[owners], x * self.shape[1] + y
+
+    def _candidates(self, lower, upper):
+        """
+        (query, box) index pairs of boxes sharing a grid cell with the query
+        boxes spanning lower to upper. May contain duplicates.
+        """
+        queries, cells = self._cells_in(self._cell_of(lower),
+                                        self._cell_of(upper))
+        starts = self._indptr[cells]
+        owners, positions = expand_ranges(starts,
+                                           self._indptr[cells + 1] - starts)
+        return queries[owners], self._ids[positions]
+
+    def _unique_pairs(self, queries, ids):
+        key = np.unique(queries * len(self) + ids)
+        return key // len(self), key % len(self)
+
+    def query_boxes(self, boxes):
+        """
+        Find every indexed box overlapping each query box.
+
+        Parameters
+        -----------
+        boxes: array-like
+        (M, 4) x0, y0, x1, y1 of each query box.
+
+        Returns
+        -----------
+        queries, ids: numpy.ndarray
+        Pairs of query box and indexed box indices, sorted by query.
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape((-1, 4))
+        lower = np.minimum(boxes[:, :2], boxes[:, 2:])
+        upper = np.maximum(boxes[:, :2], boxes[:, 2:])
+        if not len(self):
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        queries, ids = self._candidates(lower, upper)
+        found = self.boxes[ids]
+        overlap = np.all((found[:, :2] <= upper[queries]) &
+                         (found[:, 2:] >= lower[queries]), axis=1)
+        return self._unique_pairs(queries[overlap], ids[overlap])
+
+    def query_points(self, points):
+        """
+        Find every indexed box containing each point.
+
+        Parameters
+        -----------
+        points: array-like
+        (M, 2) x, y coordinates.
+
+        Returns
+        -----------
+        queries, ids: numpy.ndarray
+        Pairs of point and box indices, sorted by point.
+        """
+        points = np.asarray(points, dtype=float).reshape((-1, 2))
+        return self.query_boxes(np.hstack([points, points]))
+
+    def query_box(self, box):
+        """
+        Sorted indices of boxes overlapping box (x0, y0, x1, y1).
+        """
+        return self.query_boxes(box)[1]
+
+    def query_point(self, point):
+        """
+        Sorted indices of boxes containing point (x, y).
+        """
+        return self.query_points(point)[1]
+
+    def distance(self, point, ids=None):
+        """
+        Euclidean distance from point to boxes ids (all boxes by default);
+        zero for boxes containing point.
+        """
+        boxes = self.boxes if ids is None else self.boxes[ids]
+        point = np.asarray(point, dtype=float)
+        delta = np.maximum(np.maximum(boxes[:, :2] - point,
+                                      point - boxes[:, 2:]), 0)
+        return np.hypot(*delta.T)
+
+    def nearest(self, point, k=1, return_distance=False):
+        """
+        The k boxes closest to point (x, y), nearest first. Searches a square
+        around point that doubles in size until it holds k boxes at most its
+        half-width away.
+        """
+        k = min(k, len(self))
+        ids = np.zeros(0, np.int64)
+        distances = np.zeros(0)
+        radius = self.cell_size
+        point = np.asarray(point, dtype=float)
+        # the search square covers the whole grid once radius exceeds this
+        corner = self.origin + self.shape * self.cell_size
+        limit = np.abs(np.concatenate([point - self.origin,
+                                       point - corner])).max()
+        while k:
+            ids = self.query_box(np.concatenate([point - radius,
+                                                 point + radius]))
+            distances = self.distance(point, ids)
+            if radius >= limit:
+                # every box has been found
+                break
+            within = distances <= radius
+            if within.sum() >= k:
+                ids, distances = ids[within], distances[within]
+                break
+            radius *= 2
+        order = np.argsort(distances, kind='stable')[:k]
+        if return_distance:
+            return ids[order], distances[order]
+        return ids[order]
+
+
+class PartitionedGridIndex(object):
+    """
+    One GridIndex per distinct label, e.g. per c, z, t position of ROI.
+
+    Parameters
+    -----------
+    boxes: array-like
+    (N, 4) x0, y0, x1, y1 of each box.
+
+    labels: array-like
+    (N, ) or (N, L) integer labels of each box.
+
+    cell_size: float
+    Shared by all partitions. See GridIndex.
+
+    wildcard: int
+    Label value matching any queried value, like ImageJ's position 0 which
+    means a ROI is shown on every channel, slice or frame.
+    """
+
+    def __init__(self, boxes, labels, cell_size=None, wildcard=0):
+        boxes = np.asarray(boxes, dtype=float).reshape((-1, 4))
+        labels = np.asarray(labels).reshape((len(boxes), -1))
+        if cell_size is None:
+            cell_size = GridIndex.default_cell_size(boxes)
+        self.wildcard = wildcard
+        keys, inverse = np.unique(labels, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        members = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[members], np.arange(len(keys) + 1))
+        self.partitions = {}
+        for j, key in enumerate(keys.tolist()):
+            ids = members[bounds[j]:bounds[j+1]]
+            self.partitions[tuple(key)] = (ids,
+                                           GridIndex(boxes[ids], cell_size))
+
+    def _matching(self, label):
+        if label is None:
+            return list(self.partitions.values())
+        label = tuple(np.atleast_1d(label).tolist())
+        return [v for k, v in self.partitions.items() if
+                all(a == b or a == self.wildcard for a, b in zip(k, label))]
+
+    def query_boxes(self, boxes, label=None):
+        """
+        See GridIndex.query_boxes(). Only boxes whose label matches label
+        are returned; all boxes if label is None.
+        """
+        queries, ids = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)]
+        for members, index in self._matching(label):
+            q, i = index.query_boxes(boxes)
+            queries.append(q)
+            ids.append(members[i])
+        queries, ids = np.concatenate(queries), np.concatenate(ids)
+        order = np.lexsort((ids, queries))
+        return queries[order], ids[order]
+
+    def query_points(self, points, label=None):
+        points = np.asarray(points, dtype=float).reshape((-1, 2))
+        return self.query_boxes(np.hstack([points, points]), label)
+
+    def query_box(self, box, label=None):
+        return self.query_boxes(box, label)[1]
+
+    def query_point(self, point, label=None):
+        return self.query_points(point, label)[1]
+
+    def nearest(self, point, k=1, label=None, return_distance=False):
+        ids, distances = [np.zeros(0, np.int64)], [np.zeros(0)]
+        for members, index in self._matching(label):
+            i, d = index.nearest(point, k, return_distance=True)
+            ids.append(members[i])
+            distances.append(d)
+        ids, distances = np.concatenate(ids), np.concatenate(distances)
+        order = np.lexsort((ids, distances))[:k]
+        if return_distance:
+            return ids[order], distances[order]
+        return ids[order]
+
+
+def bounding_boxes(coordinates, offsets):
+    """
+    (N, 4) x0, y0, x1, y1 of the vertices of each of many ROI; NaN for ROI
+    without vertices.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    nonempty = np.diff(offsets) > 0
+    boxes = np.full((len(offsets) - 1, 4), np.nan)
+    if len(coordinates):
+        starts = offsets[:-1][nonempty]
+        boxes[nonempty, :2] = np.minimum.reduceat(coordinates, starts)
+        boxes[nonempty, 2:] = np.maximum.reduceat(coordinates, starts)
+    return boxes
+
+
+def _index(coordinates, offsets, index=None):
+    """
+    GridIndex of the bounding boxes of the ROI with vertices, and the ROI
+    index of each of its boxes.
+    """
+    if index is not None:
+        return index, np.arange(len(offsets) - 1)
+    members = np.flatnonzero(np.diff(offsets) > 0)
+    return GridIndex(bounding_boxes(coordinates, offsets)[members]), members
+
+
+def points_in_polygons(points, coordinates, offsets, index=None,
+                       chunk_size=100000):
+    """
+    Find every polygon containing each point (even-odd rule). Candidates are
+    polygons whose bounding box contains the point, found with a GridIndex;
+    each candidate is then tested against all of its edges at once.
+
+    Parameters
+    -----------
+    points: numpy.ndarray
+    (P, 2) x, y coordinates.
+
+    coordinates, offsets: numpy.ndarray
+    Vertices of N polygons; see helpers.geometry.resample_many().
+
+    index: GridIndex
+    GridIndex(bounding_boxes(coordinates, offsets)), to reuse between
+    calls if every polygon has vertices. Built if None.
+
+    chunk_size: int
+    Number of points tested at a time, to limit memory use.
+
+    Returns
+    -----------
+    point_ids, polygon_ids: numpy.ndarray
+    Pairs of point and containing polygon indices, sorted by point.
+    """
+    points = np.asarray(points, dtype=float).reshape((-1, 2))
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    index, members = _index(coordinates, offsets, index)
+    _, following = neighbours(offsets, True)
+    n = np.diff(offsets)
+
+    found_points, found_polygons = [np.zeros(0, np.int64)], \
+        [np.zeros(0, np.int64)]
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+        queries, candidates = index.query_points(chunk)
+        candidates = members[candidates]
+        # one row per candidate pair and edge of the candidate polygon
+        pairs, edges = expand_ranges(offsets[:-1][candidates],
+                                     n[candidates])
+        x, y = chunk[queries[pairs]].T
+        x0, y0 = coordinates[edges].T
+        x1, y1 = coordinates[following[edges]].T
+        straddles = (y0 <= y) != (y1 <= y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        crosses = straddles & (x < crossing)
+        inside = np.bincount(pairs, weights=crosses,
+                             minlength=len(queries)) % 2 == 1
+        found_points.append(queries[inside] + start)
+        found_polygons.append(candidates[inside])
+    return np.concatenate(found_points), np.concatenate(found_polygons)
+
+
+def assign_points(points, coordinates, offsets, index=None,
+                  chunk_size=100000):
+    """
+    Assign each point to the smallest polygon containing it, e.g. spots to
+    cells; nested polygons such as nuclei inside cells thus take
+    precedence. See points_in_polygons().
+
+    Returns
+    -----------
+    numpy.ndarray
+    (P, ) polygon index of each point, -1 if it is in none.
+    """
+    points = np.asarray(points, dtype=float).reshape((-1, 2))
+    point_ids, polygon_ids = points_in_polygons(points, coordinates, offsets,
+                                                index, chunk_size)
+    area = area_many(coordinates, offsets)
+    # for each point, the containing polygon with the smallest area
+    order = np.lexsort((polygon_ids, area[polygon_ids], point_ids))
+    point_ids, polygon_ids = point_ids[order], polygon_ids[order]
+    first = np.ones(len(point_ids), dtype=bool)
+    first[1:] = point_ids[1:] != point_ids[:-1]
+    ret = np.full(len(points), -1, dtype=np.int64)
+    ret[point_ids[first]] = polygon_ids[first]
+    return ret
+
+
+def _segment_distances(points, coordinates, offsets, queries, candidates,
+                       closed):
+    """
+    Distance from points[queries] to the nearest segment of each candidate
+    line.
+    """
+    n = np.diff(offsets)
+    _, following = neighbours(offsets, closed)
+    pairs, vertices = expand_ranges(offsets[:-1][candidates], n[candidates])
+    p = points[queries[pairs]]
+    a, b = coordinates[vertices], coordinates[following[vertices]]
+    ab = b - a
+    length = (ab**2).sum(axis=1)
+    t = np.divide(((p - a) * ab).sum(axis=1), length,
+                  out=np.zeros_like(length), where=length > 0)
+    closest = a + np.clip(t, 0, 1)[:, None] * ab
+    distance = np.hypot(*(p - closest).T)
+    ret = np.full(len(queries), np.inf)
+    nonempty = n[candidates] > 0
+    if len(distance):
+        starts = (np.cumsum(n[candidates]) - n[candidates])[nonempty]
+        ret[nonempty] = np.minimum.reduceat(distance, starts)
+    return ret
+
+
+def nearest_lines(points, coordinates, offsets, closed=False,
+                  max_distance=None, index=None):
+    """
+    Nearest line, e.g. membrane trace, to each point, measured to the
+    closest point on its segments.
+
+    Candidate lines are those whose bounding box is within a search radius
+    of the point. The radius starts at the index's cell size and doubles for
+    points whose nearest candidate is farther than the radius, so every
+    point is resolved in a few vectorized passes.
+
+    Parameters
+    -----------
+    points: numpy.ndarray
+    (P, 2) x, y coordinates.
+
+    coordinates, offsets: numpy.ndarray
+    Vertices of N lines; see helpers.geometry.resample_many().
+
+    closed: bool or numpy.ndarray
+    Whether the lines, or each line, connect back to their first vertex.
+
+    max_distance: float
+    Don't assign points farther than this from every line.
+
+    index: GridIndex
+    See points_in_polygons().
+
+    Returns
+    -----------
+    line_ids: numpy.ndarray
+    (P, ) index of the nearest line, -1 if none.
+
+    distances: numpy.ndarray
+    (P, ) distance to it, inf if none.
+    """
+    points = np.asarray(points, dtype=float).reshape((-1, 2))
+    coordinates = np.asarray(coordinates, dtype=float).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    index, members = _index(coordinates, offsets, index)
+    line_ids = np.full(len(points), -1, dtype=np.int64)
+    distances = np.full(len(points), np.inf)
+    if not len(index):
+        return line_ids, distances
+
+    radius = index.cell_size
+    corner = index.origin + index.shape * index.cell_size
+    # farthest any point is from the grid's edge
+    limit = np.abs(np.concatenate([points - index.origin,
+                                   points - corner], axis=1)).max() \
+        if len(points) else 0.
+    if max_distance is not None:
+        radius = min(radius, max_distance)
+        limit = min(limit, max_distance)
+    pending = np.arange(len(points))
+    while len(pending):
+        p = points[pending]
+        queries, candidates = index.query_boxes(
+            np.hstack([p - radius, p + radius]))
+        candidates = members[candidates]
+        distance = _segment_distances(p, coordinates, offsets, queries,
+                                      candidates, closed)
+        # nearest candidate of each point
+        order = np.lexsort((candidates, distance, queries))
+        queries, candidates = queries[order], candidates[order]
+        distance = distance[order]
+        first = np.ones(len(queries), dtype=bool)
+        first[1:] = queries[1:] != queries[:-1]
+        queries, candidates = queries[first], candidates[first]
+        distance = distance[first]
+        # a line closer than radius has its bounding box within radius, so
+        # these points are done
+        done = distance <= radius
+        line_ids[pending[queries[done]]] = candidates[done]
+        distances[pending[queries[done]]] = distance[done]
+        resolved = np.zeros(len(pending), dtype=bool)
+        resolved[queries[done]] = True
+        if radius >= limit:
+            # every line was a candidate, or every line within max_distance
+            within = distance <= (np.inf if max_distance is None
+                                  else max_distance)
+            line_ids[pending[queries[within]]] = candidates[within]
+            distances[pending[queries[within]]] = distance[within]
+            break
+        pending = pending[~resolved]
+        radius = min(radius * 2, limit)
+    return line_ids, distances
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*- 
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy as np
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+
+from fijitools.io.roi.roi_table import ROITable
+
+
+class ROICache(object):
+    """
+    On-disk cache of ROITable objects parsed from ImageJ/FIJI zip files, so
+    that archives read on every run are parsed only once. Each table is stored
+    as one .npy file per column in a directory named after the archive's
+    key; loading it memory-maps the columns rather than decompressing and
+    parsing every ROI again.
+
+    Archives are keyed by their central directory, i.e. the name, CRC-32 and
+    size of every member, which changes whenever any ROI does but is read
+    without decompressing anything. Copies of one archive share an entry.
+
+    Parameters
+    -----------
+    directory: str
+    Where to store cached tables. Created if it doesn't exist.
+
+    max_bytes: int
+    Once the cache grows beyond this size, the least recently used tables
+    are removed. If None, the cache grows without bound.
+    """
+
+    # ROITable attributes, in the order of ROITable.__init__ arguments
+    columns = ['common', 'bounding_rect', 'types', 'names', 'props',
+               'coordinates', 'offsets', 'counters', 'positions']
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(path, *args):
+        """
+        Hash of the zip file's central directory and of any parsing options
+        in args, e.g. IJZipReader.regexp and sep.
+        """
+        digest = hashlib.sha1()
+        with zipfile.ZipFile(path, 'r') as f:
+            for info in f.infolist():
+                digest.update('{}\0{}\0{}\0'.format(
+                    info.filename, info.CRC, info.file_size).encode())
+        digest.update(repr(args).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def __contains__(self, key):
+        return os.path.isdir(self._path(key))
+
+    def get(self, key):
+        """
+        Load a cached table, memory-mapped copy-on-write: it may be modified
+        like a freshly parsed one, without affecting the cache.
+
+        Returns
+        -----------
+        roi_table.ROITable or None
+        None if key is not cached.
+        """
+        path = self._path(key)
+        try:
+            columns = [np.load(os.path.join(path, c + '.npy'),
+                               mmap_mode='c') for c in self.columns]
+        except FileNotFoundError:
+            return None
+        # mark as recently used
+        os.utime(path)
+        columns[self.columns.index('props')] = self._decode_props(
+            columns[self.columns.index('props')],
+            np.load(os.path.join(path, 'props_offsets.npy')))
+        return ROITable(*columns)
+
+    @staticmethod
+    def _encode_props(props):
+        """
+        ROI properties as one UTF-8 encoded buffer and (N + 1, ) character
+        offsets of each ROI's string, like ROITable.coordinates and offsets.
+        A fixed width string array would pad every row to the longest one.
+        """
+        offsets = np.zeros(len(props) + 1, dtype=np.int64)
+        np.cumsum(list(map(len, props)), out=offsets[1:])
+        buffer = np.frombuffer(''.join(props).encode('utf-8'), np.uint8)
+        return buffer, offsets
+
+    @staticmethod
+    def _decode_props(buffer, offsets):
+        text = buffer.tobytes().decode('utf-8')
+        return [text[start:stop] for start, stop in
+                zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    def put(self, key, table):
+        """
+        Store table, then evict the least recently used tables if the cache
+        is too large.
+        """
+        path = self._path(key)
+        # write to a temporary directory and rename it, so that concurrent
+        # readers never see a partially written table
+        tmp = tempfile.mkdtemp(prefix=key + '.', suffix='.tmp',
+                               dir=self.directory)
+        try:
+            for c in self.columns:
+                if c == 'props':
+                    buffer, offsets = self._encode_props(table.props)
+                    np.save(os.path.join(tmp, 'props_offsets.npy'), offsets)
+                    np.save(os.path.join(tmp, 'props.npy'), buffer)
+                else:
+                    np.save(os.path.join(tmp, c + '.npy'), getattr(table, c))
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # another thread or process cached the same archive first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+
+    def _entries(self):
+        """
+        (mtime, size, key) of every cached table, least recently used first.
+        """
+        ret = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or entry.name.endswith('.tmp'):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path))
+            ret.append((entry.stat().st_mtime, size, entry.name))
+        return sorted(ret)
+
+    @property
+    def size(self):
+        """
+        Total size of the cached tables in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used tables, except keep, until the cache is no
+        larger than self.max_bytes.
+        """
+        if self.max_bytes is None:
+            return
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key != keep:
+                shutil.rmtree(self._path(key), ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        for _, _, key in self._entries():
+            shutil.rmtree(self._path(key), ignore_errors=True)
@@ -26,14 +26,18 @@ import warnings
 from abc import ABC, abstractmethod
 from PyQt5.QtGui import QFont, QFontMetrics
 
-from fijitools.helpers.iteration import current_and_next
-from fijitools.helpers.coordinate import Coordinate
+from fijitools.helpers.coordinate import Coordinate, CoordinateArray
+from fijitools.helpers.geometry import curvature_many, max_thickness_many, \
+    resample, spline
 from fijitools.helpers.data_structures import RoiPropsDict
+from fijitools.helpers.ellipse import ellipse_vertices
 from fijitools.helpers.iteration import isiterable
+from fijitools.helpers.spatial import assign_points, nearest_lines, \
+    points_in_polygons
 from fijitools.io.roi import (HEADER_SIZE, HEADER2_SIZE,
                               HEADER_DTYPE, HEADER2_DTYPE,
                               OPTIONS, SUBTYPE, ROI_TYPE,
-                              COLOR_DTYPE, SELECT_ROI_PARAMS)
+                              SELECT_ROI_PARAMS)
 
 
 # TODO: store ROI coordinates in physical units e.g. nanometers instead
@@ -45,13 +49,18 @@ class BaseROI(ABC):
     roi_type = None
     compatible_roi = []
     skipped_fields = {'hdr': [], 'hdr2': []}
+    # no per-instance __dict__; every subclass declares its own attributes
+    __slots__ = ('from_ImageJ', 'select_params', '_roi_props', '_top_left',
+                 '_sides')
 
     def __init__(self, common, props, from_ImageJ=True):
         # populate properties common to all ROI into a numpy array
         # this makes it convenient to later export self as an ImageJ bytestream
         self.from_ImageJ = from_ImageJ
         if from_ImageJ:
-            # loaded with roi_read.IJZipReader, already formated
+            # loaded with roi_read.IJZipReader, already formated. When created
+            # by a ROITable, this is a row of the table's common array, not a
+            # copy, so changes are visible to both
             self.select_params = common
         elif isinstance(common, dict):
             d = OrderedDict(**SELECT_ROI_PARAMS['hdr'],
@@ -120,12 +129,17 @@ class BaseROI(ABC):
 
     @property
     def roi_props(self):
+        # the raw string is only parsed the first time it is needed
+        if isinstance(self._roi_props, str):
+            self._roi_props = RoiPropsDict(string=self._roi_props)
         return self._roi_props
 
     @roi_props.setter
     def roi_props(self, value):
-        if isinstance(value, (str, bytes)):
-            self._roi_props = RoiPropsDict(string=str(value))
+        if isinstance(value, RoiPropsDict):
+            self._roi_props = value
+        elif isinstance(value, (str, bytes)):
+            self._roi_props = str(value)
         elif isinstance(value, dict):
             self._roi_props = RoiPropsDict(**value)
         else:
@@ -232,6 +246,113 @@ class BaseROI(ABC):
     def _encode_points(self):
         pass
 
+    @staticmethod
+    def _encode_strings(strings):
+        """
+        Encode strings as UTF-16BE all at once.
+
+        Returns
+        -----------
+        list of bytes
+        """
+        strings = list(strings)
+        lengths = np.array([len(st) for st in strings], dtype=np.int64)
+        encoded = ''.join(strings).encode('utf-16-be')
+        if len(encoded) != 2*lengths.sum():
+            # surrogate pairs: encode one by one
+            return [st.encode('utf-16-be') for st in strings]
+        bounds = np.zeros(len(strings) + 1, dtype=np.int64)
+        np.cumsum(2*lengths, out=bounds[1:])
+        bounds = bounds.tolist()
+        return [encoded[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    @staticmethod
+    def _encode_headers(rois, names, image_name=''):
+        """
+        Fill ImageJ header arrays of many ROI at once. Coordinates, names,
+        roi properties and point counters vary in length, and are returned
+        encoded as lists of bytes.
+
+        Returns
+        -----------
+        hdr: numpy.ndarray
+        HEADER_DTYPE array of length len(rois).
+
+        hdr2: numpy.ndarray
+        HEADER2_DTYPE array of length len(rois).
+
+        parts: list of lists of bytes
+        Encoded coordinates, names, roi properties and point counters.
+        """
+        n = len(rois)
+        hdr = np.zeros(n, dtype=HEADER_DTYPE)
+        hdr2 = np.zeros(n, dtype=HEADER2_DTYPE)
+        common = np.concatenate(
+            [np.atleast_1d(np.asarray(roi.select_params)) for roi in rois])
+
+        # hdr data
+        keys = list(SELECT_ROI_PARAMS['hdr'].keys())
+        hdr[keys] = common[keys]
+        encoded_points = [roi._encode_points() for roi in rois]
+        n_coordinates = np.zeros(n, dtype=np.int64)
+        for i, roi in enumerate(rois):
+            try:
+                n_coordinates[i] = len(roi.points)
+            except (NotImplementedError, TypeError):
+                pass
+        # ImageJ stores the number of vertices as an unsigned short; above
+        # 65535, it is set to zero and the count is stored as an int in place
+        # of x1 (see IJZipReader._get_n_coordinates)
+        large = n_coordinates > 0xffff
+        hdr['n_coordinates'] = np.where(large, 0, n_coordinates).astype(
+            np.uint16).view(np.int16)
+        hdr['x1'].view('>i4')[large] = n_coordinates[large]
+        points_length = np.array(list(map(len, encoded_points)),
+                                 dtype=np.int64)
+        hdr['hdr2_offset'] = HEADER_SIZE + 4 + points_length
+
+        top_left = np.array([roi.top_left['px'] for roi in rois],
+                            dtype='f4').reshape((-1, 2))
+        sides = np.array([roi.sides['px'] for roi in rois],
+                         dtype='f4').reshape((-1, 2))
+        bottom_right = top_left + sides
+        hdr['left'], hdr['top'] = top_left.astype(int).T
+        hdr['right'], hdr['bottom'] = bottom_right.astype(int).T
+        # subpixel rectangles and ovals: x, y, width, height
+        subpixel = np.logical_and(
+            common['options'] & OPTIONS['subpixel'],
+            np.isin(common['type'], [ROI_TYPE['rectangle'],
+                                     ROI_TYPE['oval']]))
+        hdr['x1'][subpixel], hdr['y1'][subpixel] = top_left[subpixel].T
+        hdr['x2'][subpixel], hdr['y2'][subpixel] = sides[subpixel].T
+
+        # hdr2 data
+        keys2 = list(SELECT_ROI_PARAMS['hdr2'].keys())
+        hdr2[keys2] = common[keys2]
+
+        # strings are stored as shorts
+        encoded_names = BaseROI._encode_strings(names)
+        names_length = np.array(list(map(len, encoded_names)),
+                                dtype=np.int64)
+        hdr2['name_offset'] = hdr['hdr2_offset'] + HEADER2_SIZE
+        hdr2['name_length'] = names_length//2
+
+        # set roi properties (text at the end of .roi file)
+        roi_props = BaseROI._encode_strings(
+            [roi.roi_props.to_string(image_name) for roi in rois])
+        props_length = np.array(list(map(len, roi_props)), dtype=np.int64)
+        hdr2['roi_props_offset'] = hdr2['name_offset'] + names_length
+        hdr2['roi_props_length'] = props_length//2
+
+        # multi-point ROI counters follow the roi properties
+        encoded_counters = [roi._encode_counters() for roi in rois]
+        hdr2['counters_offset'] = np.where(
+            list(map(len, encoded_counters)),
+            hdr2['roi_props_offset'] + props_length, 0)
+
+        return hdr, hdr2, [encoded_points, encoded_names, roi_props,
+                           encoded_counters]
+
     @classmethod
     def to_IJ(cls, roi, name, image_name=''):
         """
@@ -256,39 +377,9 @@ class BaseROI(ABC):
         -----------
         bytes
         """
-        hdr = np.zeros(1, dtype=HEADER_DTYPE)
-        hdr2 = np.zeros(1, dtype=HEADER2_DTYPE)
-
-        # hdr data
-        keys = list(SELECT_ROI_PARAMS['hdr'].keys())
-        hdr[keys] = roi.select_params[keys]
-        try:
-            hdr['hdr2_offset'] = HEADER_SIZE + 4 + \
-                len(roi.points)*(4+8*int(roi.subpixel))
-        except NotImplementedError:
-            hdr['hdr2_offset'] = HEADER_SIZE + 4
-
-        x0, y0 = roi.top_left['px']
-        x1, y1 = (roi.top_left + roi.sides)['px']
-        coords = (y0, x0, y1, x1)
-        if roi.subpixel:
-            hdr[['x1', 'y1', 'x2', 'y2']] = coords
-        hdr[['top', 'left', 'bottom', 'right']] = tuple(map(int, coords))
-
-        # hdr2 data
-        keys2 = list(SELECT_ROI_PARAMS['hdr2'].keys())
-        hdr2[keys2] = roi.select_params[keys2]
-
-        # name is stored as shorts
-        encoded_name = cls._encode_name(name)
-        hdr2['name_offset'] = hdr['hdr2_offset'] + HEADER2_SIZE
-        hdr2['name_length'] = len(encoded_name)//2
-
-        # set roi properties (text at the end of .roi file)
-        roi_props = roi.roi_props.to_IJ(image_name)
-        hdr2['roi_props_offset'] = hdr['hdr2_offset'] + HEADER2_SIZE + \
-            len(encoded_name)
-        hdr2['roi_props_length'] = len(roi_props)
+        hdr, hdr2, parts = cls._encode_headers([roi], [name], image_name)
+        encoded_points, encoded_name, roi_props, encoded_counters = \
+            [p[0] for p in parts]
 
         if roi.__class__ == cls:
             pass
@@ -303,10 +394,71 @@ class BaseROI(ABC):
             raise TypeError("{} is not compatible with {}'s to_IJ() "
                             "method.".format(roi.__class__, cls))
 
-        encoded_points = roi._encode_points()
-
         return (hdr.tobytes() + encoded_points + b'\x00\x00\x00\x00' +
-                hdr2.tobytes() + encoded_name + roi_props)
+                hdr2.tobytes() + encoded_name + roi_props + encoded_counters)
+
+    @staticmethod
+    def to_IJ_many(rois, names, image_name=''):
+        """
+        Like to_IJ(), but encodes many ROI, each as its own class, in one
+        pass. Header fields of all ROI are filled into one array and the
+        bytestreams are sliced from one contiguous buffer.
+
+        Arguments
+        -----------
+        rois: sequence of concrete subclasses of BaseROI
+
+        names: sequence of str
+        Name of each ROI.
+
+        image_name: str (optional)
+        Image name to be written into roi_props.
+
+        Returns
+        -----------
+        list of memoryview
+        One bytestream per ROI.
+        """
+        rois = list(rois)
+        names = list(names)
+        if not len(rois) == len(names):
+            raise ValueError('Number of ROI and names must be equal.')
+        if not rois:
+            return []
+        hdr, hdr2, parts = BaseROI._encode_headers(rois, names, image_name)
+        # layout of each bytestream:
+        # hdr | points | 4 empty bytes | hdr2 | name | props | counters
+        lengths = [np.array(list(map(len, p)), dtype=np.int64)
+                   for p in parts]
+        points_length, var_lengths = lengths[0], lengths[1:]
+        sizes = HEADER_SIZE + points_length + 4 + HEADER2_SIZE + \
+            np.sum(var_lengths, axis=0)
+        starts = np.zeros(len(rois) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=starts[1:])
+        buffer = np.zeros(starts[-1], dtype=np.uint8)
+
+        def scatter(part_starts, part, part_lengths):
+            data = np.frombuffer(b''.join(part), dtype=np.uint8)
+            local = np.arange(len(data)) - np.repeat(
+                np.cumsum(part_lengths) - part_lengths, part_lengths)
+            buffer[np.repeat(part_starts, part_lengths) + local] = data
+
+        buffer[starts[:-1, None] + np.arange(HEADER_SIZE)] = \
+            hdr.view(np.uint8).reshape((-1, HEADER_SIZE))
+        scatter(starts[:-1] + HEADER_SIZE, parts[0], points_length)
+        hdr2_starts = starts[:-1] + hdr['hdr2_offset']
+        buffer[hdr2_starts[:, None] + np.arange(HEADER2_SIZE)] = \
+            hdr2.view(np.uint8).reshape((-1, HEADER2_SIZE))
+        part_starts = hdr2_starts + HEADER2_SIZE
+        for part, part_lengths in zip(parts[1:], var_lengths):
+            scatter(part_starts, part, part_lengths)
+            part_starts = part_starts + part_lengths
+
+        view = memoryview(buffer)
+        return [view[a:b] for a, b in zip(starts[:-1], starts[1:])]
+
+    def _encode_counters(self):
+        return b''
 
     def to_nested_dict(self, attrs, *args):
         """
@@ -342,6 +494,7 @@ class BaseROI(ABC):
 
 class TextROI(BaseROI):
     roi_type = 'rectangle'
+    __slots__ = ('text', 'font_size', 'font_name')
 
     def __init__(self, text, topleft, font_size, c, t, z, font_name='Courier'):
         super().__init__({'c': c, 't': t, 'z': z, 'subtype': SUBTYPE['text']},
@@ -393,7 +546,7 @@ class NonTextROI(BaseROI):
     ImageJ's text ROI has a very different format from other ROI types, so
     they deserve their own parent class.
     """
-    pass
+    __slots__ = ()
 
 
 class RectROI(NonTextROI):
@@ -410,6 +563,7 @@ class RectROI(NonTextROI):
                                'image_opacity', 'image_size',
                                'float_stroke_width']}
     compatible_roi = ['oval', 'ellipse']
+    __slots__ = ()
 
     def __init__(self, bounding_rect, common, props='', from_ImageJ=True,
                  **kwargs):
@@ -430,49 +584,114 @@ class PointContainingROI(NonTextROI):
     """
     Abstract base class for ellipse, polygon, polyline, etc.
     """
+    __slots__ = ('_points', )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._points = None
 
     def _update_bounding_rect(self):
-        pts = np.array([c['px'] for c in self._points])
+        pts = self._points['px']
         top_left = pts.min(axis=0)
         sides = pts.max(axis=0) - top_left
         self._top_left = Coordinate(px=top_left)
         self._sides = Coordinate(px=sides)
 
     def _set_points(self, pts):
-        def rollback():
-            self._points = old_points
+        """
+        Store points as a CoordinateArray. pts may be a CoordinateArray, an
+        iterable of Coordinate or an (N, 2) array of pixel coordinates, which
+        is kept as is rather than copied.
+        """
+        if isinstance(pts, CoordinateArray):
+            points = pts
+        elif len(pts) and isinstance(pts[0], Coordinate):
+            try:
+                points = CoordinateArray.from_coordinates(pts)
+            except AttributeError as e:
+                raise AttributeError('Not all pixelsizes in points are '
+                                     'equal.') from e
+        else:
+            points = CoordinateArray(pts)
+        self._points = points
+
+    def _encode_coordinates(self, arr):
+        """
+        Encode an (N, 2) array of x, y pixel coordinates the way ImageJ
+        stores them: x then y coordinates as shorts relative to the bounding
+        rectangle, followed by absolute x then y floats if subpixel.
+        """
+        arr = np.asarray(arr, dtype='f4')
+        relative = np.floor(arr - self._top_left['px']).astype('>i2')
+        ret = relative.tobytes('F')
+        if self.subpixel:
+            ret += arr.astype('>f4').tobytes('F')
+        return ret
 
-        old_points = copy.copy(self._points)
-        self._points = [Coordinate(**c) if isinstance(c, Coordinate)
-                        else Coordinate(px=c) for c in pts]
-        ps = filter(lambda x: getattr(x, 'pixelsize'), self._points)
 
-        try:
-            prev = next(ps)
-        except StopIteration:
-            # empty iterator -> no pixelsizes set in self._points
-            pass
+class PointROI(PointContainingROI):
+    """
+    Multi-point ROI, e.g. the output of spot detection. Coordinates, point
+    counters and c/z/t positions are stored as numpy arrays rather than one
+    Coordinate per point, because such ROI often contain many thousands of
+    points.
+
+    Parameters
+    -----------
+    points: numpy.ndarray
+    (N, 2) array of x, y coordinates in pixels.
+
+    counters: numpy.ndarray
+    (N, ) array. Index of the counter (point set) each point belongs to.
+
+    positions: numpy.ndarray
+    (N, ) array. ImageJ stack position of each point; zero if unset.
+    """
+    roi_type = 'point'
+    __slots__ = ('counters', 'positions')
+
+    def __init__(self, common, points, props='', from_ImageJ=True,
+                 counters=None, positions=None, **kwargs):
+        super().__init__(common, props, from_ImageJ)
+        self._points = np.asarray(points, dtype='f4').reshape((-1, 2))
+        n = len(self._points)
+        if counters is None:
+            counters = np.zeros(n, dtype=np.uint8)
+        if positions is None:
+            positions = np.zeros(n, dtype=np.uint32)
+        self.counters = np.asarray(counters)
+        self.positions = np.asarray(positions)
+        if 'bounding_rect' in kwargs.keys():
+            self._set_bounding_rect(kwargs['bounding_rect'])
         else:
-            # make sure all points whose pixelsize property is not None
-            # have the same pixelsize
-            for p in ps:
-                if not p == prev:
-                    rollback()
-                    raise AttributeError('Not all pixelsizes in self._points '
-                                         'are equal. Rolling back.')
-                prev = p
+            self._update_bounding_rect()
 
-            try:
-                # also sets pixelsizes of every element in self._points
-                self.pixelsize = prev
-            except AttributeError as e:
-                rollback()
-                raise AttributeError('Cannot set pixelsize from self._points.'
-                                     'Rolling back') from e
+    def __str__(self) -> str:
+        return "PointROI: {} points".format(len(self._points))
+
+    def _update_bounding_rect(self):
+        if not len(self._points):
+            # zero-size rectangle at the origin
+            self._top_left = Coordinate(px=np.zeros(2, dtype='f4'))
+            self._sides = Coordinate(px=np.zeros(2, dtype='f4'))
+            return
+        top_left = self._points.min(axis=0)
+        self._top_left = Coordinate(px=top_left)
+        self._sides = Coordinate(px=self._points.max(axis=0) - top_left)
+
+    @property
+    def points(self):
+        return self._points
+
+    def _encode_points(self):
+        return self._encode_coordinates(self._points)
+
+    def _encode_counters(self):
+        if not np.any(self.counters) and not np.any(self.positions):
+            return b''
+        values = (self.positions.astype(np.uint32) << 8) | \
+            (self.counters.astype(np.uint32) & 0xff)
+        return values.astype('>u4').tobytes()
 
 
 # not tested
@@ -487,7 +706,6 @@ class EllipseROI(PointContainingROI):
     xc, yc, a, b, theta: centroid coordinates, axis lengths and angle
 
     """
-    roi_type = None
     skipped_fields = {'hdr': ['shape_roi_size', 'arrow_style', 'point_type',
                               'arrow_head_size', 'rounded_rect_arc_size',
                               'position'],
@@ -495,16 +713,13 @@ class EllipseROI(PointContainingROI):
                                'image_opacity', 'image_size',
                                'float_stroke_width']}
     compatible_roi = []
+    __slots__ = ('vertices', )
 
     def __init__(self, common, props='', from_ImageJ=True, **kwargs):
         super().__init__(common, props, from_ImageJ)
         # self.select_params['subtype'] = SUBTYPE['ellipse']
         # default setting from imageJ
         self.vertices = 72
-        if self.subpixel:
-            self.roi_type = 'freehand'
-        else:
-            self.roi_type = 'oval'
 
         if from_ImageJ:
             self._set_bounding_rect(kwargs['bounding_rect'])
@@ -514,16 +729,20 @@ class EllipseROI(PointContainingROI):
                 # aspect ratio = minor / major length
                 self.aspect_ratio = np.min(ratio)
 
-        if 'points' in kwargs.keys() and any(kwargs['points']):
+        # without points, ovals are described by their bounding rectangle
+        # alone; vertices are generated on request, for all ovals of a table
+        # at once by roi_table.ROITable.oval_vertices()
+        if 'points' in kwargs.keys() and len(kwargs['points']):
             self._set_points(kwargs['points'])
             self._update_bounding_rect()
             self._calculate_aspect_ratio()
 
-        else:
-            if self.select_params['aspect_ratio']:
-                kwargs['aspect_ratio'] = self.select_params['aspect_ratio']
-            # determine whether it's x0, y0 or xc, yc
-            self._calculate_points(**kwargs)
+    @property
+    def roi_type(self):
+        # ImageJ saves subpixel ellipses as freehand ROI
+        if self.subpixel:
+            return 'freehand'
+        return 'oval'
 
     def __str__(self) -> str:
         top_left = self._top_left
@@ -540,22 +759,12 @@ class EllipseROI(PointContainingROI):
     def _calculate_points(self, **kwargs):
         # untested
         # for calculating points from bounding rectangle + aspect ratio
-        beta1 = np.array([2*i*np.pi/self.vertices for
-                          i in range(self.vertices)])
         major = np.hypot(*self.sides['px'])
         minor = self.aspect_ratio*major
-        dx = np.sin(beta1) * major / 2.0
-        dy = np.cos(beta1) * minor / 2.0
-        beta2 = np.arctan2(dx, dy)
-        rad = np.hypot(dx, dy)
-        beta3 = beta2 + self.angle / 180.0 * np.pi
-        dx2 = np.sin(beta3)*rad
-        dy2 = np.cos(beta3)*rad
-        points = self.centroid['px'][None, :] + np.array([dx2, dy2]).T
-        if self.pixelsize:
-            return [Coordinate(px=p, nm=p*self.pixelsize) for p in points]
-        else:
-            return [Coordinate(px=p) for p in points]
+        # ImageJ rotates vertices clockwise by self.angle
+        points = ellipse_vertices(self.centroid['px'], [major / 2, minor / 2],
+                                  -np.deg2rad(self.angle), self.vertices)[0]
+        return CoordinateArray(points, self.pixelsize or None)
 
     @property
     def points(self):
@@ -586,37 +795,23 @@ class EllipseROI(PointContainingROI):
 
 class PolygonROI(PointContainingROI):
     roi_type = 'polygon'
+    __slots__ = ('_profile_grids', )
 
     def __init__(self, common, points, props='', from_ImageJ=True, **kwargs):
+        # points read by roi_read.IJZipReader are already relative to the
+        # image's top left corner, even if ImageJ stored them relative to
+        # the bounding rectangle
         super().__init__(common, props, from_ImageJ)
-        if from_ImageJ:
-            points = self._adjust_ImageJ_points(points, 
-                                                kwargs['bounding_rect'])
+        # created on first profile_grid() call
+        self._profile_grids = None
         self._set_points(points)
         if 'bounding_rect' in kwargs.keys():
             self._set_bounding_rect(kwargs['bounding_rect'])
         else:
             self._update_bounding_rect()
 
-    def _adjust_ImageJ_points(self, pts, bounding_rect):
-        """
-        If ImageJ ROI is not subpixel, its points are stored relative to the
-        top left corner's coordinates. Here we adjust them to be relative
-        to the image's top left corner.
-        """
-        if self.subpixel:
-            return pts
-        else:
-            return pts + bounding_rect[:2].astype(int)
-
     def _encode_points(self):
-        arr = np.array([p['px'] for p in self._points])
-        if self.subpixel:
-            arr_sub = arr
-        else:
-            arr_sub = np.zeros_like(arr)
-        arr_nonsub = (arr - self._top_left['px']).astype(np.int16)
-        return arr_sub.tobytes('F') + arr_nonsub.tobytes('F')
+        return self._encode_coordinates(self._points['px'])
 
     @property
     def top_left(self):
@@ -646,20 +841,10 @@ class PolygonROI(PointContainingROI):
         if not self._sides.pixelsize == c:
             self._sides.pixelsize = c
 
-        for p in self._points:
-            if not p.pixelsize == c:
-                p.pixelsize = c
+        self._points.pixelsize = c
 
         self.roi_props['pixelsize'] = c
 
-    @property
-    def spline_fit(self):
-        return False
-
-
-class PolyLineROI(PolygonROI):
-    roi_type = 'polyline'
-
     @property
     def spline_fit(self):
         return bool(self.select_params['options'] & OPTIONS['spline_fit'])
@@ -673,16 +858,158 @@ class PolyLineROI(PolygonROI):
             self.select_params['options'] = \
                 self.select_params['options'] & ~OPTIONS['spline_fit']
 
+    @property
+    def closed(self):
+        # FreeLineROI also holds freehand ROI, so check the ImageJ type
+        return int(self.select_params['type']) in (
+            ROI_TYPE['polygon'], ROI_TYPE['freehand'], ROI_TYPE['traced'])
+
+    def resample(self, spacing=0.5):
+        """
+        Points spaced equally along the ROI's outline, at most spacing pixels
+        apart. If self.spline_fit, samples a cubic spline through the
+        vertices, as ImageJ displays it; otherwise the straight segments.
+
+        Returns
+        -----------
+        numpy.ndarray
+        (n, 2) x, y coordinates in pixels.
+        """
+        if self.spline_fit:
+            return spline(self._points['px'], spacing, self.closed)
+        return resample(self._points['px'], spacing, self.closed)
+
+    def curvature(self):
+        """
+        Curvature at each vertex; see helpers.geometry.curvature_many().
+        """
+        return curvature_many(self._points['px'], [0, len(self._points)],
+                              self.closed)
+
+    @property
+    def max_thickness(self):
+        """
+        The most this ROI can be widened on either side: its smallest radius
+        of curvature.
+        """
+        return max_thickness_many(self._points['px'],
+                                  [0, len(self._points)], self.closed)[0]
+
+    @staticmethod
+    def curvature_many(rois):
+        """
+        Curvature at each vertex of many ROI at once.
+
+        Returns
+        -----------
+        curvature, offsets: numpy.ndarray
+        The curvature of rois[i] is curvature[offsets[i]:offsets[i + 1]].
+        """
+        coordinates, offsets, closed = PolygonROI._concatenate(rois)
+        return curvature_many(coordinates, offsets, closed), offsets
+
+    @staticmethod
+    def _concatenate(rois):
+        """
+        Vertices of many ROI in the columnar format of helpers.geometry.
+        """
+        points = [roi._points['px'] for roi in rois]
+        offsets = np.zeros(len(points) + 1, dtype=np.int64)
+        np.cumsum(list(map(len, points)), out=offsets[1:])
+        closed = np.array([roi.closed for roi in rois], dtype=bool)
+        return np.concatenate(points + [np.zeros((0, 2))]), offsets, closed
+
+    def contains(self, points):
+        """
+        Boolean array, True for each of the (P, 2) points inside the ROI.
+        """
+        points = np.asarray(points, dtype=float).reshape((-1, 2))
+        ret = np.zeros(len(points), dtype=bool)
+        if self.closed:
+            ret[points_in_polygons(points, self._points['px'],
+                                   [0, len(self._points)])[0]] = True
+        return ret
+
+    def distance(self, points):
+        """
+        Distance from each of the (P, 2) points to the ROI's outline.
+        """
+        return nearest_lines(points, self._points['px'],
+                             [0, len(self._points)], self.closed)[1]
+
+    @staticmethod
+    def assign_points(points, rois):
+        """
+        Index into rois of the smallest closed ROI containing each point, -1
+        if none; see helpers.spatial.assign_points(). E.g. assign detected
+        spots to cell outlines.
+        """
+        # open ROI contain nothing
+        rows = np.array([i for i, roi in enumerate(rois) if roi.closed],
+                        dtype=np.int64)
+        coordinates, offsets, _ = PolygonROI._concatenate(
+            [rois[i] for i in rows])
+        assigned = assign_points(points, coordinates, offsets)
+        return np.append(rows, -1)[assigned]
+
+    @staticmethod
+    def nearest(points, rois, max_distance=None):
+        """
+        Index into rois of the ROI whose outline is nearest each point, and
+        the distance to it; see helpers.spatial.nearest_lines(). E.g. the
+        distance of spots to membrane traces.
+        """
+        coordinates, offsets, closed = PolygonROI._concatenate(rois)
+        return nearest_lines(points, coordinates, offsets, closed,
+                             max_distance)
+
+    def profile_grid(self, thickness=0., spacing=1.):
+        """
+        Sampling grid for intensity profiles along the ROI, cached so that
+        profiles of many images, e.g. timepoints, reuse it. See
+        analysis.profile.ProfileGrid.
+        """
+        key = (thickness, spacing, self.spline_fit)
+        if self._profile_grids is None:
+            self._profile_grids = {}
+        try:
+            return self._profile_grids[key]
+        except KeyError:
+            # imported here so that the io package doesn't depend on the
+            # analysis package
+            from fijitools.analysis.profile import ProfileGrid
+            samples = self.resample(spacing)
+            grid = ProfileGrid(samples, [0, len(samples)], thickness,
+                               self.closed)
+            self._profile_grids[key] = grid
+            return grid
+
+    def profile(self, image, thickness=0., spacing=1., order=1):
+        """
+        Mean intensity of image, indexed image[x, y], every spacing pixels
+        along the ROI, across a width of 2 * thickness.
+        """
+        return self.profile_grid(thickness, spacing).profiles(image, order)
+
+
+class PolyLineROI(PolygonROI):
+    roi_type = 'polyline'
+    __slots__ = ()
+
 
 class FreeLineROI(PolygonROI):
     roi_type = 'freeline'
+    __slots__ = ()
 
 
-def ROI(bounding_rect, common, points, props, typ, from_ImageJ=True):
+def ROI(bounding_rect, common, points, props, typ, from_ImageJ=True,
+        **kwargs):
     """
-    Factory function for generating ROI from ImageJ data.
+    Factory function for generating ROI from ImageJ data. kwargs are passed
+    on to the ROI class, e.g. counters and positions of a PointROI.
     """
     number_to_roi_class = {ROI_TYPE['rectangle']: RectROI,
+                           ROI_TYPE['point']: PointROI,
                            ROI_TYPE['oval']: EllipseROI,
                            ROI_TYPE['polygon']: PolygonROI,
                            ROI_TYPE['freeline']: FreeLineROI,
@@ -696,5 +1023,5 @@ def ROI(bounding_rect, common, points, props, typ, from_ImageJ=True):
     #                    bounding_rect=bounding_rect, points=points)
     else:
         cls_ = number_to_roi_class[typ]
-        return cls_(common=common, props=props, from_ImageJ=from_ImageJ, 
-                    bounding_rect=bounding_rect, points=points)
+        return cls_(common=common, props=props, from_ImageJ=from_ImageJ,
+                    bounding_rect=bounding_rect, points=points, **kwargs)
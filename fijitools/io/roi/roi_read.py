@@ -22,18 +22,21 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import numpy as np
 import re
 import zipfile
+import mmap
 import os
-from struct import unpack, unpack_from
+from struct import unpack_from
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import repeat
 
-from fijitools.helpers.data_structures import IndexedDict
+from fijitools.helpers.data_structures import IndexedDict, LazyValue
 from fijitools.io import IO
 from fijitools.io.roi import (HEADER_SIZE, HEADER2_SIZE,
                               HEADER_DTYPE, HEADER2_DTYPE,
                               COLOR_DTYPE, OPTIONS,
                               SUBTYPE, ROI_TYPE, COLOR_DTYPE,
                               SELECT_ROI_PARAMS)
-from fijitools.io.roi.roi_objects import ROI
+from fijitools.io.roi.roi_table import ROITable
 
 
 class Reader(IO):
@@ -70,12 +73,23 @@ class IJZipReader(Reader):
     format: [class][sep][integer]. If sep is not None -- in which case every
     ROI is read as a distinct group -- then IJRoiDecoder stores ROI data in
     nested dictionary format.
+
+    cache: roi_cache.ROICache
+    If given, read_table() stores parsed archives in, and loads them from,
+    this on-disk cache.
     """
 
-    def __init__(self, regexp='.*roi$', sep=None):
+    # ROI types whose vertices are stored after the header
+    point_types = [ROI_TYPE['polygon'], ROI_TYPE['freeline'],
+                   ROI_TYPE['polyline'], ROI_TYPE['freehand'],
+                   ROI_TYPE['point']]
+
+    def __init__(self, regexp='.*roi$', sep=None, cache=None):
         self.regexp = re.compile(regexp)
         self.sep = sep
+        self.cache = cache
         self.data = IndexedDict()
+        self._file = None
 
     @property
     def paths(self):
@@ -90,7 +104,7 @@ class IJZipReader(Reader):
     def items(self):
         return self.data.items()
 
-    def read(self, path, pwd=None, name=None):
+    def read(self, path, pwd=None, name=None, lazy=False):
         """
         Parameters
         -----------
@@ -103,87 +117,355 @@ class IJZipReader(Reader):
         name: str
         How to (re)name the zip file. If left as None, name is the file
         name sans extension.
+
+        lazy: bool
+        Only read the zip file's directory and each ROI's 64-byte header up
+        front. Each ROI is parsed the first time it is accessed in
+        self.data, and cached. Note that in this case ROI are keyed by
+        their file names within the zip (sans extension) rather than the
+        names stored in the ROI bytestreams; ImageJ's RoiManager saves ROI
+        such that the two are the same.
+        """
+        name = self._get_name(path, name)
+        if lazy:
+            self.data[name] = self._read_lazy(path, pwd)
+        else:
+            self.data[name] = self.read_table(path, pwd).to_dict()
+
+    def _read_lazy(self, path, pwd=None):
+        self._open(path)
+        infolist = [info for info in self._file.infolist()
+                    if self.regexp.match(info.filename)]
+        headers = [None]*len(infolist)
+        for i, info in enumerate(infolist):
+            start = self._get_member_offset(info)
+            if start is None:
+                with self._file.open(info, 'r', pwd=pwd) as f:
+                    headers[i] = f.read(HEADER_SIZE)
+            else:
+                headers[i] = self._view[start:start+HEADER_SIZE]
+
+        ret = IndexedDict()
+        for info, header in zip(infolist, headers):
+            # file type checking: .roi files' first four bytes encode 'Iout'
+            if len(header) < HEADER_SIZE or header[:4] != b'Iout':
+                continue
+            roi_name = os.path.splitext(os.path.basename(info.filename))[0]
+            group, index = self._split_name(roi_name)
+            value = LazyValue(self._read_member, path, info.filename, pwd)
+            if index:
+                ret[group][index] = value
+            else:
+                ret[group] = value
+        return ret
+
+    def _read_member(self, path, filename, pwd=None):
+        """
+        Parse a single zip file member, e.g. on first access of a ROI read
+        with read(..., lazy=True).
+        """
+        if self._file is not None and self._file.fp is not None and \
+                self._file.filename == path:
+            bytestreams = self._read_members([self._file.getinfo(filename)],
+                                             pwd)
+        else:
+            # another file has since been opened, or self was cleaned up
+            with zipfile.ZipFile(path, 'r') as zf:
+                with zf.open(filename, 'r', pwd=pwd) as f:
+                    bytestreams = [f.read()]
+        return self._parse_bytestream(bytestreams)[0]
+
+    def read_many(self, paths, pwd=None, names=None, workers=None,
+                  processes=False):
+        """
+        Read several zip files concurrently. Results are added to self.data
+        in the order of paths, exactly as if read() had been called on each
+        path in turn.
+
+        Parameters
+        -----------
+        paths: iterable of str
+        Paths to the files.
+
+        pwd: str
+        Password shared by all zip files, if any.
+
+        names: iterable of str
+        How to (re)name each zip file. If left as None, names are the file
+        names sans extension.
+
+        workers: int
+        Maximum number of threads or processes. Defaults to the
+        concurrent.futures default.
+
+        processes: bool
+        Parse in worker processes instead of threads. Decompression releases
+        the GIL, but parsing does not, so processes pay off for archives
+        with many ROI.
         """
+        paths = list(paths)
+        if names is None:
+            names = [None]*len(paths)
+        names = [self._get_name(p, n) for p, n in zip(paths, names)]
+        executor_class = ProcessPoolExecutor if processes else \
+            ThreadPoolExecutor
+        with executor_class(max_workers=workers) as executor:
+            tables = executor.map(_read_table, paths,
+                                  repeat(self.regexp.pattern),
+                                  repeat(self.sep), repeat(pwd),
+                                  repeat(self.cache))
+            for name, table in zip(names, tables):
+                self.data[name] = table.to_dict()
+
+    @staticmethod
+    def _get_name(path, name=None):
         if name is None:
             name = os.path.basename(path).split(os.path.extsep)[0]
-        self.data[name] = IndexedDict()
+        return name
+
+    def read_table(self, path, pwd=None):
+        """
+        Read a zip file without creating one ROI object per ROI.
+
+        Parameters
+        -----------
+        path: str
+        Path to the file.
+
+        pwd: str
+        Zip files may be password protected.
+
+        Returns
+        -----------
+        roi_table.ROITable
+        Columnar ROI data. ROI objects are created only when indexed.
+        """
+        if self.cache is not None:
+            key = self.cache.key(path, self.regexp.pattern, self.sep)
+            table = self.cache.get(key)
+            if table is None:
+                table = self._read_table(path, pwd)
+                self.cache.put(key, table)
+            return table
+        return self._read_table(path, pwd)
+
+    def _read_table(self, path, pwd=None):
         # reads all the zip files' byte streams, sends them to parsing function
-        self._file = zipfile.ZipFile(path, 'r')
-        filelist = [f for f in self._file.namelist() if self.regexp.match(f)]
-        streams = [None]*len(filelist)
-        for i, roi_name in enumerate(filelist):
-            with self._file.open(roi_name, 'r') as f:
-                streams[i] = f.read()
+        self._open(path)
+        infolist = [info for info in self._file.infolist()
+                    if self.regexp.match(info.filename)]
+        streams = self._read_members(infolist, pwd)
 
         # file type checking: .roi files' first four bytes encode 'Iout'
         self.bytestreams = [s for s in streams if s[:4] == b'Iout']
-        self._parse_bytestream(name)
+        return self._parse_bytestream(self.bytestreams)
+
+    def iter_tables(self, path, chunk_size=1000, pwd=None):
+        """
+        Read a zip file chunk_size members at a time, so that memory use is
+        bounded regardless of the size of the archive.
+
+        Parameters
+        -----------
+        path: str
+        Path to the file.
 
-    def _parse_bytestream(self, filename):
+        chunk_size: int
+        Number of zip file members parsed together.
+
+        pwd: str
+        Zip files may be password protected.
+
+        Yields
+        -----------
+        roi_table.ROITable
+        Columnar ROI data of up to chunk_size ROI.
+        """
+        self._open(path)
+        infolist = [info for info in self._file.infolist()
+                    if self.regexp.match(info.filename)]
+        for start in range(0, len(infolist), chunk_size):
+            streams = self._read_members(infolist[start:start+chunk_size],
+                                         pwd)
+            bytestreams = [s for s in streams if s[:4] == b'Iout']
+            if bytestreams:
+                yield self._parse_bytestream(bytestreams)
+
+    def iter_rois(self, path, chunk_size=1000, pwd=None):
+        """
+        Like iter_tables(), but yields individual ROI.
+
+        Yields
+        -----------
+        group: str
+
+        index: str
+        Empty if self.sep is None or not in the ROI name.
+
+        roi: roi_objects.BaseROI child class
+        """
+        for table in self.iter_tables(path, chunk_size, pwd):
+            for (group, index), roi in zip(table.names.tolist(), table):
+                yield group, index, roi
+
+    def _open(self, path):
+        """
+        Open the zip file, and memory-map it so that uncompressed members
+        can be read without copying.
+        """
+        self.cleanup()
+        self._file = zipfile.ZipFile(path, 'r')
+        self._fp = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._fp.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # e.g. empty files cannot be mapped
+            self._mmap = self._view = None
+        else:
+            self._view = memoryview(self._mmap)
+
+    def _read_members(self, infolist, pwd=None):
+        """
+        Returns
+        -----------
+        list of bytes-like objects, one per zipfile.ZipInfo in infolist.
+        Members stored without compression are zero-copy memoryview slices of
+        the memory-mapped zip file. Compressed or encrypted members are
+        decompressed into bytes.
+        """
+        streams = [None]*len(infolist)
+        for i, info in enumerate(infolist):
+            start = self._get_member_offset(info)
+            if start is None:
+                with self._file.open(info, 'r', pwd=pwd) as f:
+                    streams[i] = f.read()
+            else:
+                streams[i] = self._view[start:start+info.file_size]
+        return streams
+
+    def _get_member_offset(self, info):
+        """
+        Position of the member's data in the zip file, or None if the member
+        cannot be read directly from the memory-mapped file.
+        """
+        if self._mmap is None or info.compress_type != zipfile.ZIP_STORED \
+                or info.flag_bits & 0x1:
+            return None
+        # the local file header's name and extra field lengths may differ
+        # from those in the central directory
+        header = self._view[info.header_offset:info.header_offset+30]
+        if len(header) < 30 or header[:4] != zipfile.stringFileHeader:
+            return None
+        name_length, extra_length = unpack_from('<HH', header, 26)
+        start = info.header_offset + 30 + name_length + extra_length
+        if start + info.file_size > len(self._view):
+            return None
+        return start
+
+    def _parse_bytestream(self, bytestreams):
         """
         Note that much of the bytestream data is not actually needed for
         creating ROI objects (see roi_objects module). Much of the bytestream
         data is therefore ignored.
         """
         # parse header data
-        hdr_buffer = b''.join([b[:HEADER_SIZE] for b in self.bytestreams])
+        hdr_buffer = b''.join([b[:HEADER_SIZE] for b in bytestreams])
         hdr = np.frombuffer(hdr_buffer, HEADER_DTYPE)
 
         hdr2_offsets = hdr['hdr2_offset']
         hdr2_buffer = b''.join([bs[off:off+HEADER2_SIZE]
                                 for off, bs in zip(hdr2_offsets,
-                                                   self.bytestreams)])
+                                                   bytestreams)])
         hdr2 = np.frombuffer(hdr2_buffer, HEADER2_DTYPE)
 
         name_offsets = hdr2['name_offset']
         name_lengths = hdr2['name_length']
-        # assumes characters are ascii-encoded...
-        names = self._get_names(name_offsets, name_lengths)
+        names = self._get_names(bytestreams, name_offsets, name_lengths)
         # determine if subpixel resolution
         subpixel = np.logical_and(hdr['options'] & OPTIONS['subpixel'],
                                   hdr['version'] >= 222)
         bounding_rect = self._get_bounding_rect(hdr, subpixel)
         # parse parameters common to all ROI
         common = self.get_common(hdr, hdr2)
-        points = self._get_points(hdr, subpixel)
+        coordinates, offsets = self._get_points(bytestreams, hdr, subpixel)
+        counters, positions = self._get_point_counters(bytestreams, hdr, hdr2)
         # roi properties encoded at the end of the bytestream
-        props = self._get_roi_props(hdr['hdr2_offset'],
+        props = self._get_roi_props(bytestreams, hdr['hdr2_offset'],
                                     hdr2['roi_props_offset'],
                                     hdr2['roi_props_length'])
 
-        for br, com, p, pr, typ, name in zip(bounding_rect, common, points,
-                                             props, hdr['type'], names):
-            if name[1]:
-                self.data[filename][name[0]][name[1]] = ROI(
-                                                         br, com, p, pr, typ)
-            else:
-                self.data[filename][name[0]] = ROI(br, com, p, pr, typ)
+        return ROITable(common, bounding_rect, hdr['type'].copy(),
+                        np.array(names, dtype=str).reshape((-1, 2)), props,
+                        coordinates, offsets, counters, positions)
 
-    def _get_names(self, offsets, lengths):
+    @staticmethod
+    def _decode_strings(bytestreams, offsets, lengths):
+        """
+        Decode the UTF-16BE encoded strings of all ROI with one
+        bytes.decode() call.
+
+        Arguments
+        -----------
+        bytestreams: list of bytes-like
+
+        offsets: numpy.ndarray
+        Byte position of each string in its bytestream.
+
+        lengths: numpy.ndarray
+        Length of each string, in UTF-16 code units.
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        buffer = b''.join([bs[off:off+2*le] for bs, off, le in zip(
+            bytestreams, offsets, lengths)])
+        text = buffer.decode('utf-16-be', errors='replace')
+        if len(text) == len(buffer) // 2:
+            # one character per code unit, so string boundaries are the
+            # cumulative lengths
+            bounds = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=bounds[1:])
+            bounds = bounds.tolist()
+            return [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        else:
+            # surrogate pairs: fall back to decoding strings one by one
+            return [bytes(bs[off:off+2*le]).decode('utf-16-be',
+                                                   errors='replace')
+                    for bs, off, le in zip(bytestreams, offsets, lengths)]
+
+    def _get_names(self, bytestreams, offsets, lengths):
         """
         Decode roi names from the bytestream. If a self.sep is provided,
         tokenize names into ROI Group / Index pairs. Otherwise, set the
         Index to an empty string.
         """
-        names = ["".join(map(chr, unpack_from('>'+'h'*le, bs, offset=off))) for
-                 bs, off, le in zip(self.bytestreams, offsets, lengths)]
+        names = self._decode_strings(bytestreams, offsets, lengths)
+        return [self._split_name(name) for name in names]
+
+    def _split_name(self, name):
         if self.sep:
-            names = [name.split(self.sep) for name in names]
-            return [li + [''] if len(li) == 1 else li for li in names]
+            # as before, only the first two tokens are used
+            return (name.split(self.sep) + [''])[:2]
         else:
-            return [[n, ''] for n in names]
+            return [name, '']
 
     def _get_bounding_rect(self, hdr, subpixel):
         """
-        Use subpixel resolution coordinates -- 
-        field names '['y1', 'x1',  'y2', 'x2']' -- where they are available. 
-        Otherwise, coerce to float32.
+        Use subpixel resolution coordinates where they are available. These
+        are only written for rectangle and oval ROI, as x, y, width and
+        height in the fields named 'x1', 'y1', 'x2', 'y2'. Otherwise, coerce
+        the integer 'left', 'top', 'right', 'bottom' fields to float32.
         """
         dtype = [('x0', 'f4'), ('y0', 'f4'), ('x1', 'f4'), ('y1', 'f4')]
+        subpixel = np.logical_and(
+            subpixel, np.isin(hdr['type'], [ROI_TYPE['rectangle'],
+                                            ROI_TYPE['oval']]))
+        subpixel_coords = hdr[['x1', 'y1', 'x2', 'y2']].astype(dtype).view(
+            'f4').reshape((-1, 4))
+        # width, height -> x1, y1
+        subpixel_coords[:, 2:] += subpixel_coords[:, :2]
         coords = np.where(
             np.repeat(subpixel[:, None], 4, 1),
-            hdr[['y1', 'x1',  'y2', 'x2']].astype(dtype).view(
-                'f4').reshape((-1, 4)),
+            subpixel_coords,
             hdr[['left', 'top', 'right', 'bottom']].astype(dtype).view(
                 'f4').reshape((-1, 4)))
         return coords
@@ -202,61 +484,148 @@ class IJZipReader(Reader):
 
         return common
 
-    def _get_points(self, hdr, subpixel):
-        # multi-point and individual points not yet implemented,
-        # but in the works
-        types = [ROI_TYPE['polygon'], ROI_TYPE['freeline'],
-                 ROI_TYPE['polyline'], ROI_TYPE['freehand']]
-        type_mask = np.isin(hdr['type'], types)
+    @staticmethod
+    def _get_n_coordinates(hdr, types):
+        """
+        Number of vertices of ROI whose type is in types, zero otherwise.
+        ImageJ stores this as an unsigned short, falling back to an int in
+        the 'x1' field position for ROI with more than 65535 vertices.
+        """
+        n = hdr['n_coordinates'].astype(np.int64) & 0xffff
+        large = hdr['x1'].astype(hdr['x1'].dtype).view('>i4')
+        n = np.where(n == 0, large, n)
+        return np.where(np.isin(hdr['type'], types), n, 0)
+
+    @staticmethod
+    def _split_coordinates(buffer, dtype, n):
+        """
+        Decode the coordinate regions of several ROI at once. Each ROI's
+        region holds its n x-coordinates followed by its n y-coordinates.
+
+        Returns
+        -----------
+        (sum(n), 2) numpy.ndarray of x, y coordinates.
+        """
+        values = np.frombuffer(buffer, dtype)
+        starts = np.cumsum(n) - n
+        # position of each vertex within its own ROI
+        local = np.arange(n.sum()) - np.repeat(starts, n)
+        x_index = np.repeat(2*starts, n) + local
+        y_index = x_index + np.repeat(n, n)
+        return np.stack([values[x_index], values[y_index]], axis=1)
+
+    def _get_points(self, bytestreams, hdr, subpixel):
+        """
+        Decode the vertices of every ROI into one flat buffer. Coordinate
+        regions of all ROI are concatenated and decoded with one
+        numpy.frombuffer() call per number format.
+
+        Returns
+        -----------
+        coordinates: numpy.ndarray
+        (M, 2) float32 array of x, y coordinates of all ROI.
+
+        offsets: numpy.ndarray
+        (N + 1, ) array of ROI start indices into coordinates.
+        """
+        n_coordinates = self._get_n_coordinates(hdr, self.point_types)
+        offsets = np.zeros(len(hdr) + 1, dtype=np.int64)
+        np.cumsum(n_coordinates, out=offsets[1:])
+        coordinates = np.zeros((offsets[-1], 2), dtype='f4')
         size = HEADER_SIZE
-        coords = [[unpack('>'+n*'f', bs[size+8*n:size+12*n]),
-                   unpack('>'+n*'f', bs[size+4*n:size+8*n])]
-                  if s else [unpack('>'+n*'h', bs[size+2*n:size+4*n]) + le,
-                             unpack('>'+n*'h', bs[size:size+2*n]) + to]
-                  for n, to, le, s, bs in zip(hdr['n_coordinates'],
-                                              hdr['top'],
-                                              hdr['left'],
-                                              subpixel,
-                                              self.bytestreams)]
-        return [(c[0], c[1]) if i else ([], []) for c, i in
-                zip(coords, type_mask)]
-
-    def _get_roi_props(self, hdr2_offsets, roi_props_offsets,
+
+        # integer coordinates are relative to the bounding rectangle
+        integer = ~subpixel
+        buffer = b''.join([bs[size:size+4*n] for n, s, bs in zip(
+            n_coordinates, subpixel, bytestreams) if not s])
+        n = n_coordinates[integer]
+        corner = np.stack([hdr['left'][integer], hdr['top'][integer]], 1)
+        vertex_mask = np.repeat(integer, n_coordinates)
+        coordinates[vertex_mask] = self._split_coordinates(
+            buffer, '>i2', n).astype(np.int32) + \
+            np.repeat(corner, n, axis=0).astype(np.int32)
+
+        # subpixel coordinates follow the integer ones, and are absolute
+        buffer = b''.join([bs[size+4*n:size+12*n] for n, s, bs in zip(
+            n_coordinates, subpixel, bytestreams) if s])
+        n = n_coordinates[subpixel]
+        vertex_mask = np.repeat(subpixel, n_coordinates)
+        coordinates[vertex_mask] = self._split_coordinates(buffer, '>f4', n)
+
+        return coordinates, offsets
+
+    def _get_roi_props(self, bytestreams, hdr2_offsets, roi_props_offsets,
                        roi_props_lengths):
-        return [''.join(list(map(chr, unpack('>' + 'h'*le, bs[off:off+le*2]))))
-                for le, bs, off in zip(
-                roi_props_lengths, self.bytestreams, roi_props_offsets)]
+        return self._decode_strings(bytestreams, roi_props_offsets,
+                                    roi_props_lengths)
 
-    def _get_point_counters(self, offsets, n_coordinates):
+    def _get_point_counters(self, bytestreams, hdr, hdr2):
         """
         This helps parse a multi-point roi.
 
         Point counters are ints that encode two parameters: 'positions' and
         'counters'. They describe which c, t, z slice the point roi lies in
         and the index of the point roi in the set, respectively. 'Position'
-        is encoded as a short in byte positions 1 and 2, and 'counter' is
-        a byte in position 3. Byte 0 is not used.
+        is encoded in the upper three bytes and 'counter' in the lowest
+        byte. The counters of all multi-point ROI are decoded with one
+        numpy.frombuffer() call.
 
         Arguments
         -----------
-        offset: int
-        hdr['counters_offset']
+        bytestreams: list of bytes-like
+
+        hdr: numpy.ndarray
+        HEADER_DTYPE array.
 
-        n_coordinates: int
-        hdr['n_coordinates']
+        hdr2: numpy.ndarray
+        HEADER2_DTYPE array.
+
+        Returns
+        -----------
+        counters, positions: numpy.ndarray
+        One value per vertex decoded by self._get_points(), zero for vertices
+        of ROI without point counters.
         """
-        data = [unpack('>'+'hbb'*(n-1) + 'hb', bs[off+1:off+n*4])
-                for n, bs, off in zip(
-                n_coordinates, self.bytestreams, offsets)]
-        positions = [p[::3] for p in data]
-        counters = [c[1::3] for c in data]
+        n_coordinates = self._get_n_coordinates(hdr, [ROI_TYPE['point']])
+        offsets = hdr2['counters_offset']
+        has_counters = np.logical_and(n_coordinates > 0, offsets > 0)
+        buffer = b''.join([bs[off:off+4*n] for n, off, bs, h in zip(
+            n_coordinates, offsets, bytestreams, has_counters) if h])
+        values = np.frombuffer(buffer, '>u4')
+
+        n_all = self._get_n_coordinates(hdr, self.point_types)
+        vertex_mask = np.repeat(has_counters, n_all)
+        counters = np.zeros(len(vertex_mask), dtype=np.uint8)
+        positions = np.zeros(len(vertex_mask), dtype=np.uint32)
+        counters[vertex_mask] = values & 0xff
+        positions[vertex_mask] = values >> 8
         return counters, positions
 
     def cleanup(self):
+        # memoryview slices of the mapped file must be released before the
+        # file can be unmapped
+        self.bytestreams = []
         try:
-            self._file.close()
-        except AttributeError:
+            self._view.release()
+            self._mmap.close()
+        except (AttributeError, BufferError):
+            # nothing is mapped, or slices are still referenced elsewhere, in
+            # which case the map is closed once they are garbage collected
             pass
+        self._view = self._mmap = None
+        for f in (getattr(self, '_fp', None), getattr(self, '_file', None)):
+            if f is not None:
+                f.close()
+        self._fp = self._file = None
+
+
+def _read_table(path, regexp, sep, pwd=None, cache=None):
+    """
+    Worker for IJZipReader.read_many(). Defined at module level so that it
+    can be sent to a process pool.
+    """
+    with IJZipReader(regexp, sep, cache) as reader:
+        return reader.read_table(path, pwd)
 
 
 class CSVReader(Reader):
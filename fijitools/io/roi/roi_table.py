@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+from fijitools.helpers.coordinate import CoordinateArray
+from fijitools.helpers.data_structures import IndexedDict, RoiPropsDict
+from fijitools.helpers.ellipse import ellipse_vertices, fit_ellipses
+from fijitools.helpers.geometry import curvature_many, max_thickness_many
+from fijitools.helpers.iteration import expand_ranges
+from fijitools.helpers.spatial import GridIndex, PartitionedGridIndex, \
+    assign_points, nearest_lines
+from fijitools.io.roi import ROI_TYPE
+from fijitools.io.roi.roi_objects import ROI
+
+
+class ROITable(object):
+    """
+    Columnar representation of every ROI parsed from one ImageJ/FIJI zip
+    file. Instead of creating one Python object per ROI, parameters are kept
+    in the numpy arrays IJZipReader already decodes them into. ROI objects
+    (see roi_objects module) are only created when an individual row is
+    accessed, and are cached thereafter.
+
+    Parameters
+    -----------
+    common: numpy.ndarray
+    Structured array of parameters common to all ROI; see
+    IJZipReader.get_common().
+
+    bounding_rect: numpy.ndarray
+    (N, 4) float32 array of x0, y0, x1, y1 in pixels.
+
+    types: numpy.ndarray
+    ImageJ ROI type of each ROI; see roi.ROI_TYPE.
+
+    names: numpy.ndarray
+    (N, 2) array of strings. Each row is a ROI's group name and index (the
+    index is an empty string if the name was not split).
+
+    props: list of str
+    Raw ROI properties strings.
+
+    coordinates: numpy.ndarray
+    (M, 2) float32 array of x, y vertex coordinates in pixels, relative to
+    the image's top left corner, of all ROI concatenated together.
+
+    offsets: numpy.ndarray
+    (N + 1, ) array. The vertices of ROI i are
+    coordinates[offsets[i]:offsets[i + 1]].
+
+    counters, positions: numpy.ndarray
+    (M, ) arrays of multi-point ROI point counters and c/z/t positions,
+    aligned with coordinates. Zero where not applicable.
+    """
+
+    def __init__(self, common, bounding_rect, types, names, props,
+                 coordinates, offsets, counters=None, positions=None):
+        self.common = common
+        self.bounding_rect = bounding_rect
+        self.types = types
+        self.names = names
+        self.props = props
+        self.coordinates = coordinates
+        self.offsets = offsets
+        if counters is None:
+            counters = np.zeros(len(coordinates), dtype=np.uint8)
+        if positions is None:
+            positions = np.zeros(len(coordinates), dtype=np.uint32)
+        self.counters = counters
+        self.positions = positions
+        self._cache = {}
+        self._indices = {}
+        self._roi_props = None
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, i):
+        """
+        Return the ROI object in row i, creating it on first access.
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('ROITable index {} out of range.'.format(i))
+        try:
+            return self._cache[i]
+        except KeyError:
+            sl = slice(self.offsets[i], self.offsets[i+1])
+            # share the parsed properties if they exist, else let the ROI
+            # parse its own string when needed
+            props = self.props[i] if self._roi_props is None else \
+                self._roi_props[i]
+            roi = ROI(self.bounding_rect[i], self.common[i],
+                      self.coordinates[sl], props, self.types[i],
+                      counters=self.counters[sl], positions=self.positions[sl])
+            self._cache[i] = roi
+            return roi
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def roi_props(self):
+        """
+        List of every ROI's properties as a RoiPropsDict, all parsed together
+        on first access. ROI objects created afterwards share them.
+        """
+        if self._roi_props is None:
+            self._roi_props = RoiPropsDict.from_strings(self.props)
+        return self._roi_props
+
+    @property
+    def n_coordinates(self):
+        return np.diff(self.offsets)
+
+    @property
+    def closed(self):
+        """
+        Boolean array, True for ROI whose outline connects back to its first
+        vertex.
+        """
+        return np.isin(self.types, [ROI_TYPE['polygon'], ROI_TYPE['freehand'],
+                                    ROI_TYPE['traced']])
+
+    def curvature(self):
+        """
+        Curvature at every vertex of every ROI, aligned with
+        self.coordinates. See helpers.geometry.curvature_many().
+        """
+        return curvature_many(self.coordinates, self.offsets, self.closed)
+
+    def max_thickness(self):
+        """
+        Largest thickness each ROI can be widened by on either side, e.g. for
+        analysis.profile.ProfileGrid. See helpers.geometry.
+        """
+        return max_thickness_many(self.coordinates, self.offsets,
+                                  self.closed)
+
+    def fit_ellipses(self):
+        """
+        Least squares ellipse through the vertices of every ROI. See
+        helpers.ellipse.fit_ellipses().
+
+        Returns
+        -----------
+        center, axes, angle: numpy.ndarray
+        """
+        return fit_ellipses(self.coordinates, self.offsets)
+
+    def oval_vertices(self, n_vertices=72):
+        """
+        Vertices of every oval ROI, the ellipse inscribed in its bounding
+        rectangle, generated with one ellipse_vertices() call.
+
+        Returns
+        -----------
+        rows: numpy.ndarray
+        (K, ) rows of the oval ROI.
+
+        vertices: numpy.ndarray
+        (K, n_vertices, 2) x, y coordinates.
+        """
+        rows = np.flatnonzero(self.types == ROI_TYPE['oval'])
+        br = self.bounding_rect[rows].astype(float)
+        return rows, ellipse_vertices((br[:, :2] + br[:, 2:]) / 2,
+                                      (br[:, 2:] - br[:, :2]) / 2,
+                                      np.zeros(len(rows)), n_vertices)
+
+    @property
+    def centroids(self):
+        """
+        CoordinateArray of each ROI's bounding rectangle center, the same
+        value as BaseROI.centroid. Supports batched comparisons, e.g.
+        table.centroids.within((x0, y0), (x1, y1)).
+        """
+        br = self.bounding_rect
+        return CoordinateArray((br[:, :2] + br[:, 2:]) / 2)
+
+    def spatial_index(self, by=('c', 'z', 't'), cell_size=None):
+        """
+        Spatial index of the ROI bounding rectangles, built on first call and
+        cached.
+
+        Parameters
+        -----------
+        by: tuple of str
+        Fields of self.common to partition ROI by. Queries then take a label,
+        e.g. (c, z, t), and only return ROI at that position or with the
+        field set to 0 (all positions). If empty, return a GridIndex of every
+        ROI.
+
+        cell_size: float
+        See helpers.spatial.GridIndex.
+
+        Returns
+        -----------
+        GridIndex or PartitionedGridIndex
+        Query results are row indices of self.
+        """
+        key = (tuple(by), cell_size)
+        try:
+            return self._indices[key]
+        except KeyError:
+            pass
+        if by:
+            labels = np.stack([self.common[field] for field in by], axis=1)
+            index = PartitionedGridIndex(self.bounding_rect, labels,
+                                         cell_size)
+        else:
+            index = GridIndex(self.bounding_rect, cell_size)
+        self._indices[key] = index
+        return index
+
+    def _gather(self, rows):
+        """
+        Vertices of a subset of rows, as (coordinates, offsets).
+        """
+        n = self.n_coordinates[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(n, out=offsets[1:])
+        _, vertices = expand_ranges(self.offsets[:-1][rows], n)
+        return self.coordinates[vertices], offsets
+
+    def assign_points(self, points, rows=None):
+        """
+        Assign each point, e.g. detected spots, to the smallest closed ROI
+        containing it. See helpers.spatial.assign_points().
+
+        Parameters
+        -----------
+        points: numpy.ndarray
+        (P, 2) x, y coordinates in pixels.
+
+        rows: numpy.ndarray
+        Rows to assign points to. Default: every closed ROI.
+
+        Returns
+        -----------
+        numpy.ndarray
+        (P, ) row of each point, -1 if it is in none.
+        """
+        rows = np.flatnonzero(self.closed) if rows is None else \
+            np.asarray(rows, dtype=np.int64)
+        assigned = assign_points(points, *self._gather(rows))
+        return np.append(rows, -1)[assigned]
+
+    def nearest(self, points, rows=None, max_distance=None):
+        """
+        ROI whose outline is nearest each point, e.g. the membrane trace
+        nearest each spot. See helpers.spatial.nearest_lines().
+
+        Parameters
+        -----------
+        points: numpy.ndarray
+        (P, 2) x, y coordinates in pixels.
+
+        rows: numpy.ndarray
+        Rows to search. Default: every ROI except points.
+
+        max_distance: float
+        Don't assign points farther than this from every ROI.
+
+        Returns
+        -----------
+        rows, distances: numpy.ndarray
+        (P, ) row of the nearest ROI, -1 if none, and distance to it.
+        """
+        rows = np.flatnonzero(self.types != ROI_TYPE['point']) \
+            if rows is None else np.asarray(rows, dtype=np.int64)
+        nearest, distances = nearest_lines(points, *self._gather(rows),
+                                           closed=self.closed[rows],
+                                           max_distance=max_distance)
+        return np.append(rows, -1)[nearest], distances
+
+    def points(self, i):
+        """
+        (n, 2) view into self.coordinates of ROI i's vertices.
+        """
+        return self.coordinates[self.offsets[i]:self.offsets[i+1]]
+
+    def to_dict(self):
+        """
+        Materialize every ROI in the same nested format as IJZipReader.data,
+        i.e. {group: ROI} or, if names were split, {group: {index: ROI}}.
+        """
+        ret = IndexedDict()
+        for i, (group, index) in enumerate(self.names.tolist()):
+            if index:
+                ret[group][index] = self[i]
+            else:
+                ret[group] = self[i]
+        return ret
@@ -24,10 +24,14 @@ import numpy as np
 import zipfile
 import h5py
 import os
-import io
+import shutil
+import tempfile
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import repeat
 
 from fijitools.io import IO
+from fijitools.io.roi.roi_objects import BaseROI
 
 
 class Writer(IO):
@@ -36,6 +40,79 @@ class Writer(IO):
         pass
 
 
+class _BufferedStream(object):
+    """
+    File-like object through which zipfile.ZipFile writes. Writes are held
+    in memory and passed on to the underlying file in one block when
+    flush_buffer() is called, which must only happen between zip members:
+    ZipFile seeks back to the start of the member it is writing in order to
+    update its local header.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._pos = f.tell()
+        # position in the file of the first byte in self._buffer
+        self._start = self._pos
+        self._buffer = bytearray()
+
+    @property
+    def buffered(self):
+        """Number of bytes held in memory."""
+        return len(self._buffer)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            self._f.seek(0, os.SEEK_END)
+            offset += max(self._f.tell(), self._start + len(self._buffer))
+        self._pos = offset
+        return self._pos
+
+    def read(self, n=-1):
+        # only needed while ZipFile reads an existing archive in 'a' mode
+        self.flush_buffer()
+        self._f.seek(self._pos)
+        data = self._f.read(n)
+        self._pos = self._f.tell()
+        return data
+
+    def write(self, data):
+        if not self._buffer:
+            self._start = self._pos
+        elif self._pos < self._start:
+            raise IOError('Cannot write to data that was already flushed.')
+        offset = self._pos - self._start
+        self._buffer[offset:offset+len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def flush(self):
+        # ZipFile flushes after every member; only flush_buffer() writes
+        pass
+
+    def flush_buffer(self):
+        if self._buffer:
+            self._f.seek(self._start)
+            self._f.write(self._buffer)
+            self._buffer = bytearray()
+        self._f.flush()
+
+    def truncate(self, size=None):
+        self.flush_buffer()
+        return self._f.truncate(self._pos if size is None else size)
+
+    def close(self):
+        if self._f.closed:
+            return
+        self.flush_buffer()
+        self._f.close()
+
+
 class IJZipWriter(Writer):
     """
     From an instance of an roi_objects.BaseROI subclass, generate
@@ -45,11 +122,83 @@ class IJZipWriter(Writer):
     -----------
     zip_path: str
     Filename.
+
+    mode: str
+    'a' to append to an existing zip file, 'w' to overwrite it.
+
+    compression: int
+    zipfile.ZIP_STORED (ImageJ's default) or zipfile.ZIP_DEFLATED, etc.
+
+    compresslevel: int
+    See zipfile.ZipFile. Requires Python 3.7 or later.
+
+    buffer_size: int
+    If nonzero, zip members are held in memory and written to disk in
+    blocks of at least buffer_size bytes. This greatly reduces the number of
+    small writes, e.g. on network-mounted file systems.
+
+    atomic: bool
+    Write to a temporary file in the same directory and only move it to
+    zip_path after cleanup() without error. Other processes thus never see a
+    partially written zip file.
+
+    workers: int
+    If not None, write_many() encodes ROI concurrently on this many
+    threads or processes, in chunks of chunk_size ROI. Bytestreams are
+    still appended to the zip file in order by the calling thread, so the
+    output is identical to serial encoding.
+
+    processes: bool
+    Encode in worker processes instead of threads. ROI encoding is mostly
+    pure Python, so processes are usually faster.
+
+    chunk_size: int
+    Number of ROI per encoding task.
     """
 
-    def __init__(self, zip_path):
+    def __init__(self, zip_path, mode='a', compression=zipfile.ZIP_STORED,
+                 compresslevel=None, buffer_size=0, atomic=False,
+                 workers=None, processes=False, chunk_size=1000):
         self.path = zip_path
-        self._file = zipfile.ZipFile(zip_path, 'a')
+        self.workers = workers
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.atomic = atomic
+        if atomic:
+            folder, basename = os.path.split(os.path.abspath(zip_path))
+            fd, self._temp_path = tempfile.mkstemp(
+                prefix='.{}.'.format(basename), suffix='.tmp', dir=folder)
+            os.close(fd)
+            if mode == 'a' and os.path.exists(zip_path):
+                shutil.copyfile(zip_path, self._temp_path)
+            else:
+                mode = 'w'
+            target = self._temp_path
+        else:
+            target = zip_path
+
+        if buffer_size:
+            if mode == 'a' and os.path.exists(target):
+                f = open(target, 'r+b')
+            else:
+                f = open(target, 'w+b')
+                mode = 'w'
+            self._stream = _BufferedStream(f)
+            target = self._stream
+        else:
+            self._stream = None
+        # compresslevel was added to ZipFile in Python 3.7
+        kwargs = {} if compresslevel is None else \
+            {'compresslevel': compresslevel}
+        self._file = zipfile.ZipFile(target, mode, compression=compression,
+                                     **kwargs)
+
+    def _writestr(self, name, data):
+        self._file.writestr(name, data)
+        if self._stream is not None and \
+                self._stream.buffered >= self.buffer_size:
+            self._stream.flush_buffer()
 
     def write(self, roi, roi_name, image_name='', as_roi_class=None):
         """
@@ -68,10 +217,90 @@ class IJZipWriter(Writer):
             data = as_roi_class.to_IJ(roi, roi_name, image_name)
         else:
             data = roi.to_IJ(roi, roi_name, image_name)
-        self._file.write(io.BytesIO(data))
+        self._writestr(roi_name + '.roi', data)
+
+    def write_many(self, rois, roi_names, image_name=''):
+        """
+        Encode many ROI in one vectorized pass (see
+        roi_objects.BaseROI.to_IJ_many) and write them to the zip file.
+        Each ROI is saved as its own class.
+
+        Parameters
+        -----------
+        rois: sequence of roi_objects.BaseROI child classes
+
+        roi_names: sequence of str
+
+        image_name: str
+        """
+        roi_names = list(roi_names)
+        if self.workers is None:
+            for roi_name, data in zip(roi_names, BaseROI.to_IJ_many(
+                    rois, roi_names, image_name)):
+                self._writestr(roi_name + '.roi', data)
+            return
+
+        rois = list(rois)
+        chunks = range(0, len(rois), self.chunk_size)
+        executor_class = ProcessPoolExecutor if self.processes else \
+            ThreadPoolExecutor
+        with executor_class(max_workers=self.workers) as executor:
+            # map() yields results in submission order
+            encoded = executor.map(
+                _encode_chunk,
+                [rois[i:i+self.chunk_size] for i in chunks],
+                [roi_names[i:i+self.chunk_size] for i in chunks],
+                repeat(image_name))
+            for i, streams in zip(chunks, encoded):
+                for roi_name, data in zip(
+                        roi_names[i:i+self.chunk_size], streams):
+                    self._writestr(roi_name + '.roi', data)
+
+    def __exit__(self, typ, value, traceback):
+        if typ is not None and self.atomic:
+            self.abort()
+        else:
+            super().__exit__(typ, value, traceback)
 
     def cleanup(self):
         self._file.close()
+        if self._stream is not None:
+            self._stream.close()
+        if self.atomic and self._temp_path is not None:
+            # mkstemp() creates the file readable by its owner only; give it
+            # the permissions a non-atomic write would have
+            try:
+                mode = os.stat(self.path).st_mode & 0o7777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(self._temp_path, mode)
+            os.replace(self._temp_path, self.path)
+            self._temp_path = None
+
+    def abort(self):
+        """
+        Close without writing anything to self.path. Only applicable if
+        self.atomic.
+        """
+        self._file.close()
+        if self._stream is not None:
+            self._stream.close()
+        try:
+            os.remove(self._temp_path)
+        except (OSError, TypeError):
+            # already removed or replaced
+            pass
+        self._temp_path = None
+
+
+def _encode_chunk(rois, roi_names, image_name=''):
+    """
+    Worker for IJZipWriter.write_many(). Defined at module level so that it
+    can be sent to a process pool.
+    """
+    return [bytes(b) for b in BaseROI.to_IJ_many(rois, roi_names, image_name)]
 
 
 class Hdf5Writer(Writer):
@@ -98,6 +98,85 @@ class CoordinateTest(unittest.TestCase):
         self.assertTrue(all(start_coord / 2. == intended_result))
         self.assertTrue(all(start_coord / [2., 2] == intended_result))
 
+    def test_lazy_units(self):
+        coord = self.create_coord()
+        self.assertEqual(set(dict.keys(coord)), {'nm'})
+        self.assertIn('m', coord)
+        np.testing.assert_allclose(coord['m'], [5e-3, 6e-3])
+        coord['um'] = (1., 2.)
+        np.testing.assert_allclose(coord['m'], [1e-3, 2e-3])
+        self.assertIsNone(coord.get('px'))
+
+    def test_units(self):
+        coord = coordinate.Coordinate(px=(1., 2.), um=(5., 6.))
+        # derived units are listed like stored ones
+        self.assertEqual(list(coord), ['px', 'nm', 'um', 'm'])
+        self.assertEqual(list(coord.keys()), ['px', 'nm', 'um', 'm'])
+        self.assertEqual(len(coord.keys()), 4)
+        units = dict(coord.items())
+        np.testing.assert_allclose(units['um'], [5., 6.])
+        np.testing.assert_allclose(list(coord.values())[3], [5e-3, 6e-3])
+        self.assertEqual(list(coordinate.Coordinate(px=1.)), ['px'])
+
+    def test_sum_fills_pixelsize(self):
+        a = coordinate.Coordinate(px=(1., 2.), nm=(100., 200.))
+        b = coordinate.Coordinate(px=(3., 4.))
+        result = a + b
+        np.testing.assert_allclose(result['px'], [4., 6.])
+        np.testing.assert_allclose(result['nm'], [400., 600.])
+
+
+class CoordinateArrayTest(unittest.TestCase):
+    def setUp(self):
+        self.px = np.array([[1., 2.], [3., 4.], [5., 6.]], dtype='f4')
+        self.coords = coordinate.CoordinateArray(self.px, pixelsize=100.)
+
+    def test_units(self):
+        self.assertTrue(np.shares_memory(self.coords['px'], self.px))
+        np.testing.assert_allclose(self.coords['nm'], self.px * 100.)
+        np.testing.assert_allclose(self.coords['um'], self.px * 0.1)
+        # cached until the pixelsize changes
+        self.assertIs(self.coords['nm'], self.coords['nm'])
+        self.coords.pixelsize = 50.
+        np.testing.assert_allclose(self.coords['nm'], self.px * 50.)
+
+    def test_no_pixelsize(self):
+        coords = coordinate.CoordinateArray(self.px)
+        self.assertNotIn('nm', coords)
+        with self.assertRaises(KeyError):
+            coords['nm']
+
+    def test_index(self):
+        point = self.coords[1]
+        self.assertIsInstance(point, coordinate.Coordinate)
+        np.testing.assert_allclose(point['nm'], [300., 400.])
+        self.assertEqual(len(self.coords[1:]), 2)
+
+    def test_from_coordinates(self):
+        coords = coordinate.CoordinateArray.from_coordinates(
+            [coordinate.Coordinate(px=p) for p in self.px])
+        np.testing.assert_array_equal(coords['px'], self.px)
+        self.assertIsNone(coords.pixelsize)
+
+    def test_compare(self):
+        other = coordinate.CoordinateArray(self.px + [[0., 0.], [1., 0.],
+                                                      [1., 1.]])
+        np.testing.assert_array_equal(self.coords == other,
+                                      [True, False, False])
+        np.testing.assert_array_equal(self.coords < other,
+                                      [False, False, True])
+        np.testing.assert_array_equal(
+            self.coords <= coordinate.Coordinate(px=(3., 4.)),
+            [True, True, False])
+
+    def test_within(self):
+        np.testing.assert_array_equal(
+            self.coords.within((2., 2.), (5., 6.)), [False, True, True])
+        lower = coordinate.Coordinate(nm=(0., 0.))
+        upper = coordinate.Coordinate(nm=(350., 450.))
+        np.testing.assert_array_equal(self.coords.within(lower, upper),
+                                      [True, True, False])
+
 
 def run():
     pass
@@ -39,6 +39,42 @@ class TrackedListTest(unittest.TestCase):
             self.assertEqual(comp, item)
 
 
+class IndexedDictTest(unittest.TestCase):
+    def test_lazy_views(self):
+        d = ds.IndexedDict()
+        d['a'] = ds.LazyValue(int, '1')
+        values, items = d.values(), d.items()
+        # views reflect later changes, like dict views
+        d['b'] = 2
+        self.assertEqual(len(values), 2)
+        self.assertEqual(list(values), [1, 2])
+        self.assertEqual(list(items), [('a', 1), ('b', 2)])
+        self.assertIn(('a', 1), items)
+        self.assertEqual(dict.__getitem__(d, 'a'), 1)
+
+
+class RoiPropsDictTest(unittest.TestCase):
+    def test_parse(self):
+        props = ds.RoiPropsDict(
+            string='pixelsize: 100\nImage Name: a: b\nno separator\n')
+        # lines with more than one ': ' separator are ignored
+        self.assertEqual(list(props.items()), [('pixelsize', '100')])
+        props = ds.RoiPropsDict(string='a: b:\nc: \n: d\n')
+        self.assertEqual(list(props.items()),
+                         [('a', 'b:'), ('c', ''), ('', 'd')])
+
+    def test_from_strings(self):
+        props = ds.RoiPropsDict.from_strings(['a: 1\n', '', 'b: 2'])
+        self.assertEqual([dict(p) for p in props],
+                         [{'a': '1'}, {}, {'b': '2'}])
+        strings = ['x: 1\ny: 2: 3\n', 'no separator', 'x: 4\n\nz: 5', '']
+        props = ds.RoiPropsDict.from_strings(strings)
+        self.assertEqual([list(p.items()) for p in props],
+                         [list(ds.RoiPropsDict(s).items()) for s in strings])
+        self.assertEqual(props[2].string, strings[2])
+        self.assertEqual(ds.RoiPropsDict.from_strings([]), [])
+
+
 def run():
     pass
 
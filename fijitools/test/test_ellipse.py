@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import unittest
+import numpy as np
+
+from fijitools.helpers import ellipse
+from fijitools.io.roi import roi_read
+from fijitools.test import DATA_DIR
+
+
+class EllipseTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        n = 100
+        self.center = rng.uniform(0, 1000, (n, 2))
+        self.axes = np.sort(rng.uniform(3, 30, (n, 2)), axis=1)[:, ::-1]
+        # keep ellipses clearly elongated so that the angle is well defined
+        self.axes[:, 1] *= 0.7
+        self.angle = rng.uniform(-np.pi/2 + 0.01, np.pi/2, n)
+
+    def test_vertices(self):
+        vertices = ellipse.ellipse_vertices(self.center, self.axes,
+                                            self.angle, 72)
+        self.assertEqual(vertices.shape, (100, 72, 2))
+        # rotate back into each ellipse's own frame
+        u, v = (vertices - self.center[:, None]).transpose(2, 0, 1)
+        cos, sin = np.cos(self.angle)[:, None], np.sin(self.angle)[:, None]
+        major, minor = u*cos + v*sin, v*cos - u*sin
+        np.testing.assert_allclose((major / self.axes[:, :1])**2 +
+                                   (minor / self.axes[:, 1:])**2, 1.)
+
+    def test_fit(self):
+        vertices = ellipse.ellipse_vertices(self.center, self.axes,
+                                            self.angle, 20)
+        coordinates = np.vstack([vertices[0], [[0., 0.], [1., 1.]],
+                                 vertices[1:].reshape((-1, 2))])
+        offsets = np.concatenate([[0, 20, 22], np.arange(2, 101) * 20 + 2])
+        center, axes, angle = ellipse.fit_ellipses(coordinates, offsets)
+        # too few points
+        self.assertTrue(np.all(np.isnan(axes[1])))
+        fitted = np.delete(np.arange(101), 1)
+        np.testing.assert_allclose(center[fitted], self.center, atol=1e-6)
+        np.testing.assert_allclose(axes[fitted], self.axes, rtol=1e-6)
+        # angles are equivalent modulo pi
+        np.testing.assert_allclose(np.sin(2 * (angle[fitted] - self.angle)),
+                                   0., atol=1e-6)
+
+    def test_collinear(self):
+        vertices = ellipse.ellipse_vertices(self.center[:2], self.axes[:2],
+                                            self.angle[:2], 20)
+        line = np.stack([np.arange(6.), 2 * np.arange(6.) + 1], axis=1)
+        coordinates = np.vstack([vertices[0], line, vertices[1]])
+        center, axes, angle = ellipse.fit_ellipses(coordinates,
+                                                   [0, 20, 26, 46])
+        self.assertTrue(np.all(np.isnan(axes[1])))
+        self.assertTrue(np.isnan(angle[1]))
+        np.testing.assert_allclose(center[[0, 2]], self.center[:2],
+                                   atol=1e-6)
+        np.testing.assert_allclose(axes[[0, 2]], self.axes[:2], rtol=1e-6)
+        # only collinear sets
+        self.assertTrue(np.all(np.isnan(
+            ellipse.fit_ellipses(line, [0, 6])[0])))
+
+    def test_table(self):
+        with roi_read.IJZipReader(sep='-') as reader:
+            table = reader.read_table(os.path.join(DATA_DIR, 'polygons.zip'))
+        center, axes, _ = table.fit_ellipses()
+        # free-0 is a circle
+        np.testing.assert_allclose(center[3], [60., 70.])
+        np.testing.assert_allclose(axes[3, 0], axes[3, 1])
+
+    def test_oval_vertices(self):
+        with roi_read.IJZipReader() as reader:
+            table = reader.read_table(os.path.join(DATA_DIR, 'ovals.zip'))
+        rows, vertices = table.oval_vertices(36)
+        np.testing.assert_array_equal(rows, [0, 1, 2])
+        self.assertEqual(vertices.shape, (3, 36, 2))
+        # the vertices span each oval's bounding rectangle
+        np.testing.assert_allclose(vertices.min(axis=1),
+                                   table.bounding_rect[:, :2])
+        np.testing.assert_allclose(vertices.max(axis=1),
+                                   table.bounding_rect[:, 2:])
+        # oval ROI objects don't compute vertices up front
+        self.assertIsNone(table[0]._points)
+
+
+def run():
+    pass
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import unittest
+import numpy as np
+
+from fijitools.helpers import geometry
+from fijitools.io.roi import roi_objects, roi_read
+from fijitools.test import DATA_DIR
+
+
+def spacings(points, closed):
+    if closed:
+        points = np.vstack([points, points[:1]])
+    return np.hypot(*np.diff(points, axis=0).T)
+
+
+class ResampleTest(unittest.TestCase):
+    rectangle = np.array([[0, 0], [4, 0], [4, 3], [0, 3]], dtype=float)
+
+    def test_resample(self):
+        closed = geometry.resample(self.rectangle, 1., closed=True)
+        self.assertEqual(len(closed), 14)
+        np.testing.assert_allclose(spacings(closed, True), 1.)
+        opened = geometry.resample(self.rectangle, 1., closed=False)
+        # 11 pixels long, with samples at both ends
+        self.assertEqual(len(opened), 12)
+        np.testing.assert_array_equal(opened[-1], [0, 3])
+
+    def test_resample_many(self):
+        coordinates = np.vstack([self.rectangle, [[5., 5.]], self.rectangle])
+        samples, offsets = geometry.resample_many(
+            coordinates, [0, 4, 5, 5, 9], 0.7, [True, False, False, False])
+        np.testing.assert_allclose(
+            samples[offsets[0]:offsets[1]],
+            geometry.resample(self.rectangle, 0.7, True))
+        # a single vertex stays put; an empty curve stays empty
+        np.testing.assert_array_equal(samples[offsets[1]:offsets[2]],
+                                      [[5., 5.]])
+        self.assertEqual(offsets[3] - offsets[2], 0)
+        np.testing.assert_allclose(
+            samples[offsets[3]:], geometry.resample(self.rectangle, 0.7))
+
+    def test_spline(self):
+        angles = np.linspace(0, 2*np.pi, 12, endpoint=False)
+        circle = 10 * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        samples = geometry.spline(circle, 0.5, closed=True)
+        np.testing.assert_allclose(np.hypot(*samples.T), 10., rtol=1e-3)
+        steps = spacings(samples, True)
+        np.testing.assert_allclose(steps, steps.mean(), rtol=1e-3)
+        self.assertLessEqual(steps.max(), 0.5)
+
+
+class CurvatureTest(unittest.TestCase):
+    def test_curvature(self):
+        angles = np.linspace(0, 2*np.pi, 40, endpoint=False)
+        circle = 7 * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        line = np.array([[0., 0.], [1., 0.], [2., 0.]])
+        coordinates = np.vstack([circle, line, circle])
+        offsets = [0, 40, 43, 43, 83]
+        closed = [True, False, False, False]
+        curvature = geometry.curvature_many(coordinates, offsets, closed)
+        np.testing.assert_allclose(curvature[:40], 1 / 7.)
+        np.testing.assert_array_equal(curvature[40:43], 0.)
+        # an open circle has no curvature at its ends
+        self.assertEqual(curvature[43], 0.)
+        self.assertEqual(curvature[-1], 0.)
+        np.testing.assert_allclose(
+            geometry.max_thickness_many(coordinates, offsets, closed),
+            [7., np.inf, np.inf, 7.])
+
+
+class PolygonGeometryTest(unittest.TestCase):
+    square = np.array([[10, 20], [40, 20], [40, 50], [10, 50]], dtype=float)
+    # 3-4-5 right triangle
+    triangle = np.array([[0, 0], [4, 0], [0, 3]], dtype=float)
+
+    def setUp(self):
+        self.coordinates = np.vstack([self.square, self.triangle,
+                                      [[5., 5.]]])
+        self.offsets = [0, 4, 7, 7, 8]
+
+    def test_area(self):
+        np.testing.assert_allclose(
+            geometry.signed_area_many(self.coordinates, self.offsets),
+            [900., 6., 0., 0.])
+        np.testing.assert_allclose(
+            geometry.area_many(self.coordinates[::-1], [0, 1, 1, 4, 8]),
+            [0., 0., 6., 900.])
+
+    def test_perimeter(self):
+        np.testing.assert_allclose(
+            geometry.perimeter_many(self.coordinates, self.offsets),
+            [120., 12., 0., 0.])
+        np.testing.assert_allclose(
+            geometry.perimeter_many(self.triangle, [0, 3], closed=False), [9.])
+
+    def test_centroid(self):
+        centroid = geometry.centroid_many(self.coordinates, self.offsets)
+        np.testing.assert_allclose(centroid[[0, 1, 3]],
+                                   [[25., 35.], [4/3., 1.], [5., 5.]])
+        self.assertTrue(np.all(np.isnan(centroid[2])))
+
+    def test_convex_hull(self):
+        # a point inside the square is dropped
+        points = np.vstack([self.square, [[20., 30.]]])
+        hull, offsets = geometry.convex_hull_many(points, [0, 5])
+        np.testing.assert_array_equal(offsets, [0, 4])
+        self.assertEqual(set(map(tuple, hull)), set(map(tuple, self.square)))
+        # several sets at once: counterclockwise from the lowest x, with
+        # collinear and repeated points reduced to their ends
+        points = np.vstack([points, [[0., 0.], [1., 1.], [2., 2.], [1., 1.]],
+                            self.triangle])
+        hull, offsets = geometry.convex_hull_many(points, [0, 5, 9, 9, 12])
+        np.testing.assert_array_equal(offsets, [0, 4, 6, 6, 9])
+        np.testing.assert_array_equal(hull[:4], [[10, 20], [40, 20],
+                                                 [40, 50], [10, 50]])
+        np.testing.assert_array_equal(hull[4:6], [[0, 0], [2, 2]])
+        np.testing.assert_array_equal(hull[6:], [[0, 0], [4, 0], [0, 3]])
+
+    def test_feret(self):
+        feret, min_feret, angle = geometry.feret_many(self.coordinates,
+                                                      self.offsets)
+        np.testing.assert_allclose(feret[[0, 1, 3]],
+                                   [30 * np.sqrt(2), 5., 0.])
+        np.testing.assert_allclose(min_feret[[0, 1, 3]], [30., 2.4, 0.])
+        self.assertTrue(np.isnan(feret[2]))
+        # y points down in images
+        self.assertAlmostEqual(angle[1], np.degrees(np.arctan2(3, 4)))
+        # a large, nearly round outline
+        t = np.linspace(0, 2*np.pi, 20000, endpoint=False)
+        ellipse = np.stack([40 * np.cos(t), 10 * np.sin(t)], axis=1)
+        feret, min_feret, angle = geometry.feret_many(ellipse, [0, 20000])
+        np.testing.assert_allclose([feret[0], min_feret[0]], [80., 20.],
+                                   rtol=1e-6)
+        self.assertAlmostEqual(np.sin(np.radians(angle[0])), 0.)
+
+
+class ROIResampleTest(unittest.TestCase):
+    roi_path = os.path.join(DATA_DIR, 'polygons.zip')
+
+    def setUp(self):
+        with roi_read.IJZipReader(sep='-') as reader:
+            self.table = reader.read_table(self.roi_path)
+
+    def test_polygon(self):
+        roi = self.table[0]
+        self.assertTrue(roi.closed)
+        self.assertFalse(roi.spline_fit)
+        # the square's perimeter is 120 pixels
+        self.assertEqual(len(roi.resample(0.5)), 240)
+
+    def test_curvature(self):
+        curvature, offsets = roi_objects.PolygonROI.curvature_many(
+            list(self.table))
+        np.testing.assert_array_equal(offsets, self.table.offsets)
+        np.testing.assert_allclose(curvature, self.table.curvature())
+        np.testing.assert_allclose(
+            [roi.max_thickness for roi in self.table],
+            self.table.max_thickness())
+        # the circle through a corner of the 30 pixel square and its
+        # neighbours
+        self.assertAlmostEqual(self.table.max_thickness()[0],
+                               15 * np.sqrt(2))
+
+    def test_spline_fit(self):
+        roi = self.table[2]
+        self.assertFalse(roi.closed)
+        straight = roi.resample(0.5)
+        roi.spline_fit = True
+        curved = roi.resample(0.5)
+        np.testing.assert_allclose(curved[[0, -1]], straight[[0, -1]],
+                                   atol=1e-9)
+        self.assertFalse(np.allclose(len(curved), len(straight)))
+
+
+def run():
+    pass
+
+
+if __name__ == '__main__':
+    run()
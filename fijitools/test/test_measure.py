@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from fijitools.analysis import measure, raster
+from fijitools.io.roi import roi_read
+from fijitools.test import DATA_DIR
+
+
+class MeasureTest(unittest.TestCase):
+    roi_path = os.path.join(DATA_DIR, 'polygons.zip')
+
+    def setUp(self):
+        with roi_read.IJZipReader(sep='-') as reader:
+            self.table = reader.read_table(self.roi_path)
+        self.spans = raster.rasterize(self.table)
+        rng = np.random.RandomState(0)
+        self.stack = rng.randint(0, 4096, (2, 3, 4, 100, 100)).astype('u2')
+
+    def test_measure(self):
+        image = self.stack[0, 0, 0]
+        result = measure.measure(image, self.spans, len(self.table),
+                                 pixel_area=0.25)
+        # poly-0 is the square x = 10...39, y = 20...49
+        square = image[10:40, 20:50]
+        self.assertEqual(result['Area'][0], 900 * 0.25)
+        self.assertAlmostEqual(result['Mean'][0], square.mean())
+        self.assertEqual(result['Min'][0], square.min())
+        self.assertEqual(result['Max'][0], square.max())
+        self.assertEqual(result['RawIntDen'][0], square.sum())
+        self.assertAlmostEqual(result['IntDen'][0], 225 * square.mean())
+        # the polyline has no area
+        self.assertEqual(result['Area'][2], 0)
+        self.assertTrue(np.isnan(result['Mean'][2]))
+
+    def test_planes(self):
+        rois, planes = measure._planes([[1, 2, 3], [0, 1, 0]], (2, 3, 4))
+        np.testing.assert_array_equal(rois, [0] + [1] * 8)
+        np.testing.assert_array_equal(planes[0], [0, 1, 2])
+        np.testing.assert_array_equal(
+            planes[1:], [[c, 0, t] for c in range(2) for t in range(4)])
+
+    def test_measure_stack(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'stack.dat')
+            stack = np.memmap(path, dtype='u2', mode='w+',
+                              shape=self.stack.shape)
+            stack[:] = self.stack
+            result = measure.measure_stack(stack, self.table)
+            del stack
+        row = result[result['roi'] == 0].iloc[0]
+        self.assertEqual(list(row[['c', 'z', 't']]), [0, 1, 2])
+        self.assertAlmostEqual(row['Mean'],
+                               self.stack[0, 1, 2, 10:40, 20:50].mean())
+
+    def test_measure_shapes(self):
+        result = measure.measure_shapes(self.table, pixelsize=0.5)
+        square = result.iloc[0]
+        self.assertEqual(square['Area'], 900 * 0.25)
+        self.assertEqual(list(square[['X', 'Y']]), [12.5, 17.5])
+        self.assertEqual(square['Perim.'], 60.)
+        self.assertAlmostEqual(square['Feret'], 15 * np.sqrt(2))
+        self.assertAlmostEqual(square['MinFeret'], 15.)
+        # the polyline encloses no area
+        self.assertTrue(np.isnan(result['Area'][2]))
+        self.assertFalse(np.isnan(result['Perim.'][2]))
+
+
+def run():
+    pass
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import unittest
+import numpy as np
+
+from fijitools.analysis.profile import ProfileGrid
+from fijitools.io.roi import roi_read, OPTIONS
+from fijitools.test import DATA_DIR
+
+
+class ProfileTest(unittest.TestCase):
+    roi_path = os.path.join(DATA_DIR, 'polygons.zip')
+
+    def setUp(self):
+        # each pixel's value is its x or y coordinate
+        self.x, self.y = np.mgrid[:100, :100].astype(float)
+
+    def test_thick_line(self):
+        # horizontal then vertical line through pixel centers
+        grid = ProfileGrid.from_curves(
+            [[5.5, 10.5], [20.5, 10.5], [20.5, 30.5]], [0, 3], thickness=2.)
+        self.assertEqual(len(grid.widths), 9)
+        values = grid.profiles(self.x)
+        np.testing.assert_allclose(values[:16], np.arange(5, 21))
+        values = grid.profiles(self.y)
+        np.testing.assert_allclose(values[:16], 10.)
+        np.testing.assert_allclose(values[-10:], np.arange(21, 31))
+
+    def test_from_table(self):
+        with roi_read.IJZipReader(sep='-') as reader:
+            table = reader.read_table(self.roi_path)
+        grid = ProfileGrid.from_table(table, thickness=1.5)
+        profiles = grid.split(grid.profiles(self.x))
+        self.assertEqual(len(profiles), len(table))
+        # the square's perimeter is 120 pixels
+        self.assertEqual(len(profiles[0]), 120)
+        roi = table[2]
+        self.assertIsNone(roi._profile_grids)
+        np.testing.assert_allclose(roi.profile(self.x, 1.5), profiles[2])
+        self.assertIs(roi.profile_grid(1.5), roi.profile_grid(1.5))
+
+    def test_spline_fit(self):
+        with roi_read.IJZipReader(sep='-') as reader:
+            table = reader.read_table(self.roi_path)
+        # spline fit the polyline only
+        table.common['options'][2] |= OPTIONS['spline_fit']
+        grid = ProfileGrid.from_table(table)
+        profiles = grid.split(grid.profiles(self.y))
+        for roi, profile in zip(table, profiles):
+            np.testing.assert_allclose(roi.profile(self.y), profile)
+
+
+def run():
+    pass
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import unittest
+import numpy as np
+
+from fijitools.analysis import raster
+from fijitools.io.roi import roi_read
+from fijitools.test import DATA_DIR
+
+
+def inside(polygon, x, y):
+    """
+    Even-odd rule point-in-polygon test, one edge at a time.
+    """
+    ret = np.zeros(x.shape, dtype=bool)
+    for (x0, y0), (x1, y1) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        if y0 == y1:
+            continue
+        crossing = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        ret ^= ((y0 <= y) != (y1 <= y)) & (x < crossing)
+    return ret
+
+
+class RasterTest(unittest.TestCase):
+    roi_path = os.path.join(DATA_DIR, 'polygons.zip')
+
+    def setUp(self):
+        with roi_read.IJZipReader(sep='-') as reader:
+            self.table = reader.read_table(self.roi_path)
+        self.spans = raster.rasterize(self.table)
+        self.x, self.y = np.mgrid[:100, :100] + 0.5
+
+    def test_polygons(self):
+        rng = np.random.RandomState(0)
+        for _ in range(10):
+            polygon = rng.uniform(0, 100, (rng.randint(3, 12), 2))
+            image = raster.label_image(
+                raster.polygon_spans(polygon, [0, len(polygon)]), (100, 100))
+            np.testing.assert_array_equal(image > 0,
+                                          inside(polygon, self.x, self.y))
+
+    def test_rasterize(self):
+        ids = raster.spans_to_pixels(self.spans)[0]
+        # the integer square has ImageJ's area; the polyline is skipped
+        self.assertEqual(np.sum(ids == 0), 900)
+        self.assertEqual(np.sum(ids == 2), 0)
+        for i in [1, 3]:
+            self.assertEqual(np.sum(ids == i), np.sum(
+                inside(self.table.points(i), self.x, self.y)))
+
+    def test_oval(self):
+        image = raster.label_image(raster.oval_spans([[0, 0, 10, 6]]),
+                                   (10, 6))
+        np.testing.assert_array_equal(image[:, 0],
+                                      [0, 0, 1, 1, 1, 1, 1, 1, 0, 0])
+        self.assertTrue(np.all(image[:, 2:4]))
+
+    def test_tiles(self):
+        image = raster.label_image(self.spans, (100, 100))
+        tiled = np.zeros_like(image)
+        for slices, tile in raster.iter_label_tiles(self.spans, (100, 100),
+                                                    (30, 40)):
+            tiled[tuple(slices)] = tile
+        np.testing.assert_array_equal(tiled, image)
+
+    def test_masks(self):
+        masks = raster.masks(self.spans, len(self.table))
+        self.assertIsNone(masks[2])
+        slices, mask = masks[0]
+        self.assertEqual(slices, [slice(10, 40), slice(20, 50)])
+        self.assertTrue(np.all(mask))
+
+
+def run():
+    pass
+
+
+if __name__ == '__main__':
+    run()
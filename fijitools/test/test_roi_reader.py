@@ -21,9 +21,16 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
 import os
+import tempfile
+import zipfile
+import numpy as np
 from addict import Dict
 
 from fijitools.test import AbstractTestClass, DATA_DIR
+from fijitools.io.roi import roi_read, roi_objects, HEADER_DTYPE, \
+    HEADER_SIZE
+from fijitools.io.roi.roi_cache import ROICache
+from fijitools.helpers.data_structures import LazyValue
 
 
 true_common = Dict({'0': {'c': 0, 't': 0, 'z': 0, 'centroid': [42.5, 193.],
@@ -53,6 +60,291 @@ class OvalReadTest(ReadTest, unittest.TestCase):
     roi_path = os.path.join(DATA_DIR, 'ovals.zip')
 
 
+class TableReadTest(unittest.TestCase):
+    roi_path = os.path.join(DATA_DIR, 'polygons.zip')
+
+    def setUp(self):
+        with roi_read.IJZipReader(sep='-') as f:
+            self.table = f.read_table(self.roi_path)
+
+    def test_split_name(self):
+        reader = roi_read.IJZipReader(sep='-')
+        self.assertEqual(reader._split_name('cell-1'), ['cell', '1'])
+        self.assertEqual(reader._split_name('cell'), ['cell', ''])
+        # tokens after the index are ignored
+        self.assertEqual(reader._split_name('cell-1-a'), ['cell', '1'])
+
+    def test_large_coordinates(self):
+        # move the integer square poly-0 beyond the int16 range
+        with zipfile.ZipFile(self.roi_path) as f:
+            stream = bytearray(f.read('poly-0.roi'))
+        hdr = np.frombuffer(stream, HEADER_DTYPE, count=1)
+        hdr = hdr.copy()
+        hdr['left'] += 32740
+        stream[:HEADER_SIZE] = hdr.tobytes()
+        table = roi_read.IJZipReader()._parse_bytestream([bytes(stream)])
+        np.testing.assert_array_equal(table.coordinates,
+                                      self.table.points(0) + [32740, 0])
+
+    def test_columns(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table.names.tolist(),
+                         [['poly', '0'], ['poly', '1'], ['line', '0'],
+                          ['free', '0']])
+        self.assertEqual(self.table.offsets.tolist(), [0, 4, 7, 11, 51])
+        self.assertEqual(self.table.coordinates.shape, (51, 2))
+
+    def test_points(self):
+        np.testing.assert_array_equal(
+            self.table.points(0), [[10, 20], [40, 20], [40, 50], [10, 50]])
+        # subpixel resolution
+        np.testing.assert_array_equal(
+            self.table.points(1), [[5.5, 5.25], [30.75, 8.5], [12.25, 28.]])
+
+    def test_lazy_roi(self):
+        self.assertFalse(self.table._cache)
+        roi = self.table[2]
+        self.assertIsInstance(roi, roi_objects.PolyLineROI)
+        self.assertIs(roi, self.table[2])
+        self.assertEqual(len(self.table._cache), 1)
+        self.assertEqual(list(roi.top_left['px']), [0., 0.])
+        self.assertEqual(list(roi.sides['px']), [30., 5.])
+
+    def test_stored_members_mapped(self):
+        reader = roi_read.IJZipReader()
+        table = reader.read_table(self.roi_path)
+        self.assertTrue(all(isinstance(b, memoryview)
+                            for b in reader.bytestreams))
+        mapped = reader._mmap
+        reader.cleanup()
+        self.assertTrue(mapped.closed)
+        # parsed data does not depend on the memory-mapped file
+        np.testing.assert_array_equal(
+            table.points(1), [[5.5, 5.25], [30.75, 8.5], [12.25, 28.]])
+
+    def test_iter(self):
+        with roi_read.IJZipReader(sep='-') as reader:
+            tables = list(reader.iter_tables(self.roi_path, chunk_size=3))
+            self.assertEqual([len(t) for t in tables], [3, 1])
+            np.testing.assert_array_equal(
+                np.concatenate([t.coordinates for t in tables]),
+                self.table.coordinates)
+            names = [(g, i) for g, i, roi in reader.iter_rois(
+                self.roi_path, chunk_size=2)]
+        self.assertEqual(names, [tuple(n) for n in self.table.names.tolist()])
+
+    def test_decode_strings(self):
+        strings = ['cell-1', '', '\u00e9\u8349', 'x\U0001F52C']
+        encoded = [s.encode('utf-16-be') for s in strings]
+        lengths = [len(e) // 2 for e in encoded]
+        # ASCII and BMP characters are decoded all at once; surrogate pairs
+        # take the slow path
+        self.assertEqual(roi_read.IJZipReader._decode_strings(
+            encoded[:3], [0]*3, lengths[:3]), strings[:3])
+        self.assertEqual(roi_read.IJZipReader._decode_strings(
+            encoded, [0]*4, lengths), strings)
+        self.assertEqual(self.table.props[1], 'pixelsize: 100\nlabel: cell\n')
+
+    def test_to_dict(self):
+        data = self.table.to_dict()
+        self.assertEqual(list(data.keys()), ['poly', 'line', 'free'])
+        self.assertIsInstance(data['free']['0'], roi_objects.FreeLineROI)
+
+    def test_spatial_index(self):
+        index = self.table.spatial_index()
+        # poly-0 is at z=2, poly-1 at z=1
+        np.testing.assert_array_equal(index.query_point((20, 25), (1, 2, 3)),
+                                      [0])
+        np.testing.assert_array_equal(index.query_point((20, 25), (1, 1, 1)),
+                                      [1])
+        self.assertIs(index, self.table.spatial_index())
+
+    def test_point_queries(self):
+        points = np.array([[20., 30.], [60., 70.], [100., 100.], [4., 2.]])
+        # the square poly-0 and the circle free-0
+        np.testing.assert_array_equal(self.table.assign_points(points),
+                                      [0, 3, -1, -1])
+        np.testing.assert_array_equal(
+            roi_objects.PolygonROI.assign_points(points, list(self.table)),
+            [0, 3, -1, -1])
+        np.testing.assert_array_equal(self.table[0].contains(points),
+                                      [True, False, False, False])
+        # the polyline line-0 runs from (0, 0) to (10, 5)
+        rows, distances = self.table.nearest(points[3:], rows=[2])
+        np.testing.assert_array_equal(rows, [2])
+        np.testing.assert_allclose(distances, 0, atol=1e-12)
+        rows, distances = self.table.nearest(points, max_distance=5.)
+        np.testing.assert_array_equal(rows, [-1, -1, -1, 2])
+        np.testing.assert_allclose(self.table[0].distance(points[:1]), 10)
+
+    def test_roi_props(self):
+        props = self.table.roi_props
+        self.assertEqual([dict(p) for p in props],
+                         [{}, {'pixelsize': '100', 'label': 'cell'}, {}, {}])
+        # ROI created afterwards share the parsed properties
+        self.assertIs(self.table[1].roi_props, props[1])
+
+    def test_compact_roi(self):
+        roi = self.table[1]
+        self.assertFalse(hasattr(roi, '__dict__'))
+        # roi properties are parsed on first access
+        self.assertIsInstance(roi._roi_props, str)
+        self.assertEqual(roi.roi_props['label'], 'cell')
+        # select_params is a view into the table's common array
+        roi.select_params['c'] = 5
+        self.assertEqual(self.table.common['c'][1], 5)
+
+    def test_centroids(self):
+        centroids = self.table.centroids
+        np.testing.assert_allclose(centroids[0]['px'],
+                                   self.table[0].centroid['px'])
+        # only the square's center, (25, 35), is inside this box
+        np.testing.assert_array_equal(
+            centroids.within((20., 30.), (30., 40.)),
+            [True, False, False, False])
+
+
+class LazyReadTest(unittest.TestCase):
+    roi_path = os.path.join(DATA_DIR, 'polygons.zip')
+
+    def test_lazy(self):
+        reader = roi_read.IJZipReader(sep='-')
+        reader.read(self.roi_path, lazy=True)
+        group = reader.data['polygons']['poly']
+        self.assertIsInstance(dict.__getitem__(group, '1'), LazyValue)
+        roi = group['1']
+        self.assertIsInstance(roi, roi_objects.PolygonROI)
+        self.assertIs(dict.__getitem__(group, '1'), roi)
+        # unaccessed entries are still placeholders
+        self.assertIsInstance(dict.__getitem__(group, '0'), LazyValue)
+        reader.cleanup()
+        # resolves after the zip file has been closed, too
+        line = reader.data['polygons']['line']['0']
+        self.assertEqual(list(line.sides['px']), [30., 5.])
+
+
+class PointReadTest(unittest.TestCase):
+    roi_path = os.path.join(DATA_DIR, 'points.zip')
+
+    def setUp(self):
+        with roi_read.IJZipReader(sep='-') as f:
+            self.table = f.read_table(self.roi_path)
+
+    def test_counters(self):
+        roi = self.table[0]
+        self.assertIsInstance(roi, roi_objects.PointROI)
+        self.assertEqual(roi.points.shape, (5, 2))
+        self.assertEqual(roi.counters.tolist(), [0, 1, 0, 1, 2])
+        self.assertEqual(roi.positions.tolist(), [1, 1, 2, 2, 3])
+        # no counters stored
+        self.assertFalse(np.any(self.table[1].counters))
+        np.testing.assert_array_equal(self.table[1].points,
+                                      [[1.5, 2.5], [4.25, 8.75]])
+
+    def test_empty(self):
+        roi = roi_objects.PointROI(self.table.common[0], np.zeros((0, 2)),
+                                   from_ImageJ=False)
+        np.testing.assert_array_equal(roi.top_left['px'], [0, 0])
+        np.testing.assert_array_equal(roi.sides['px'], [0, 0])
+
+    def test_round_trip(self):
+        streams = [roi.to_IJ(roi, 'spot-{}'.format(i))
+                   for i, roi in enumerate(self.table)]
+        table = roi_read.IJZipReader(sep='-')._parse_bytestream(streams)
+        np.testing.assert_array_equal(table.coordinates,
+                                      self.table.coordinates)
+        np.testing.assert_array_equal(table.counters, self.table.counters)
+        np.testing.assert_array_equal(table.positions, self.table.positions)
+
+
+class ReadManyTest(unittest.TestCase):
+    paths = [os.path.join(DATA_DIR, name) for name in
+             ('rectangles.zip', 'polygons.zip', 'ovals.zip')]
+
+    def test_matches_serial(self):
+        serial = roi_read.IJZipReader(sep='-')
+        for path in self.paths:
+            serial.read(path)
+        with roi_read.IJZipReader(sep='-') as parallel:
+            parallel.read_many(self.paths, workers=2)
+        self.assertEqual(parallel.paths, serial.paths)
+        for name in serial.paths:
+            for group in serial.data[name]:
+                for index, roi in serial.data[name][group].items():
+                    other = parallel.data[name][group][index]
+                    self.assertIs(type(other), type(roi))
+                    self.assertEqual(list(other.top_left['px']),
+                                     list(roi.top_left['px']))
+        serial.cleanup()
+
+
+class CacheTest(unittest.TestCase):
+    roi_path = os.path.join(DATA_DIR, 'polygons.zip')
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = ROICache(self.tempdir.name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def read(self, path=None, sep='-'):
+        with roi_read.IJZipReader(sep=sep, cache=self.cache) as reader:
+            return reader.read_table(path or self.roi_path)
+
+    def test_read(self):
+        parsed = self.read()
+        cached = self.read()
+        self.assertIsInstance(cached.coordinates, np.memmap)
+        for column in ROICache.columns:
+            np.testing.assert_array_equal(getattr(cached, column),
+                                          getattr(parsed, column))
+        self.assertEqual(cached[1].roi_props['label'], 'cell')
+        # cached tables are copy-on-write
+        cached.common['c'][0] = 5
+        self.assertEqual(self.read().common['c'][0], 1)
+
+    def test_props(self):
+        props = ['', 'label: cell\n', 'name: \u00e9t\u00e9 \u2713\n' * 50]
+        buffer, offsets = ROICache._encode_props(props)
+        # stored ragged rather than padded to the longest string
+        self.assertEqual(buffer.dtype, np.uint8)
+        self.assertEqual(ROICache._decode_props(buffer, offsets), props)
+        self.assertEqual(ROICache._decode_props(*ROICache._encode_props([])),
+                         [])
+
+    def test_concurrent(self):
+        with roi_read.IJZipReader(sep='-', cache=self.cache) as reader:
+            reader.read_many([self.roi_path]*8, names=list('abcdefgh'),
+                             workers=8)
+            self.assertEqual(len(reader.data), 8)
+        # one complete entry, no temporary directories left behind
+        self.assertEqual(os.listdir(self.tempdir.name),
+                         [ROICache.key(self.roi_path, '.*roi$', '-')])
+        self.assertEqual(len(self.read()), 4)
+
+    def test_key(self):
+        key = ROICache.key(self.roi_path, '.*roi$', '-')
+        self.read()
+        self.assertIn(key, self.cache)
+        # parsing options are part of the key
+        self.read(sep=None)
+        self.assertNotEqual(key, ROICache.key(self.roi_path, '.*roi$', None))
+        self.assertEqual(len(os.listdir(self.tempdir.name)), 2)
+
+    def test_evict(self):
+        self.read()
+        self.cache.max_bytes = self.cache.size
+        other = os.path.join(DATA_DIR, 'points.zip')
+        self.read(other)
+        # the least recently used table made room for the new one
+        self.assertNotIn(ROICache.key(self.roi_path, '.*roi$', '-'),
+                         self.cache)
+        self.assertIn(ROICache.key(other, '.*roi$', '-'), self.cache)
+        self.cache.clear()
+        self.assertEqual(self.cache.size, 0)
+
+
 def run():
     pass
 
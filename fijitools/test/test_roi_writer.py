@@ -21,9 +21,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
 import os
+import tempfile
+import zipfile
+import numpy as np
 
 from fijitools.test import AbstractTestClass, DATA_DIR, run_tests
-from fijitools.io.roi import roi_write
+from fijitools.io.roi import roi_write, roi_read, roi_objects
 
 
 class WriteTest(AbstractTestClass):
@@ -50,6 +53,123 @@ class OvalWriteTest(WriteTest, unittest.TestCase):
     h5_path = os.path.join(DATA_DIR, 'ovals.h5')
 
 
+class ZipWriteTest(unittest.TestCase):
+    roi_paths = [os.path.join(DATA_DIR, name) for name in
+                 ('polygons.zip', 'points.zip', 'rectangles.zip')]
+
+    def setUp(self):
+        self.tables = []
+        for path in self.roi_paths:
+            with roi_read.IJZipReader() as reader:
+                self.tables.append(reader.read_table(path))
+        self.rois = [roi for table in self.tables for roi in table]
+        self.names = [n[0] for table in self.tables
+                      for n in table.names.tolist()]
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.zip_path = os.path.join(self.tempdir.name, 'out.zip')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def read_back(self):
+        with roi_read.IJZipReader() as reader:
+            return reader.read_table(self.zip_path)
+
+    def test_write_many_matches_to_IJ(self):
+        many = roi_objects.BaseROI.to_IJ_many(self.rois, self.names, 'im')
+        for roi, name, data in zip(self.rois, self.names, many):
+            self.assertEqual(bytes(data), roi.to_IJ(roi, name, 'im'))
+
+    def test_many_vertices(self):
+        # more vertices than fit in the header's unsigned short
+        table = self.tables[0]
+        angle = np.linspace(0, 2*np.pi, 70000, endpoint=False)
+        points = np.floor(np.stack([60 + 20*np.cos(angle),
+                                    70 + 20*np.sin(angle)], axis=1))
+        bounding_rect = np.concatenate([points.min(axis=0),
+                                        points.max(axis=0)])
+        roi = roi_objects.ROI(bounding_rect, table.common[3].copy(), points,
+                              '', table.types[3])
+        data = roi_objects.BaseROI.to_IJ_many([roi], ['free-0'])
+        read = roi_read.IJZipReader()._parse_bytestream([bytes(data[0])])
+        np.testing.assert_array_equal(read.offsets, [0, 70000])
+        np.testing.assert_array_equal(read.coordinates, points)
+
+    def test_write_many(self):
+        with roi_write.IJZipWriter(self.zip_path) as writer:
+            writer.write_many(self.rois, self.names)
+        table = self.read_back()
+        self.assertEqual(table.names[:, 0].tolist(), self.names)
+        np.testing.assert_array_equal(
+            table.coordinates,
+            np.concatenate([t.coordinates for t in self.tables]))
+        np.testing.assert_array_equal(
+            table.bounding_rect,
+            np.concatenate([t.bounding_rect for t in self.tables]))
+
+    def test_buffered_compressed_append(self):
+        kwargs = dict(compression=zipfile.ZIP_DEFLATED, buffer_size=256,
+                      atomic=True)
+        for suffix in ('', '-copy'):
+            with roi_write.IJZipWriter(self.zip_path, **kwargs) as writer:
+                writer.write_many(self.rois,
+                                  [n + suffix for n in self.names])
+        with zipfile.ZipFile(self.zip_path) as f:
+            self.assertIsNone(f.testzip())
+            self.assertEqual(len(f.infolist()), 2*len(self.rois))
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_DEFLATED
+                                for info in f.infolist()))
+        table = self.read_back()
+        self.assertEqual(len(table), 2*len(self.rois))
+
+    def test_parallel(self):
+        def members(path):
+            with zipfile.ZipFile(path) as f:
+                return [(info.filename, f.read(info))
+                        for info in f.infolist()]
+
+        with roi_write.IJZipWriter(self.zip_path) as writer:
+            writer.write_many(self.rois, self.names)
+        parallel_path = os.path.join(self.tempdir.name, 'parallel.zip')
+        with roi_write.IJZipWriter(parallel_path, workers=2,
+                                   chunk_size=2) as writer:
+            writer.write_many(self.rois, self.names)
+        self.assertEqual(members(parallel_path), members(self.zip_path))
+
+    def test_atomic_abort(self):
+        with self.assertRaises(RuntimeError):
+            with roi_write.IJZipWriter(self.zip_path, atomic=True) as writer:
+                writer.write_many(self.rois, self.names)
+                raise RuntimeError()
+        # neither the zip file nor the temporary file exist
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+
+    def test_atomic_mode(self):
+        umask = os.umask(0o022)
+        try:
+            writer = roi_write.IJZipWriter(self.zip_path, atomic=True)
+            writer.write_many(self.rois, self.names)
+            writer.cleanup()
+            # closing again is harmless
+            writer.cleanup()
+            self.assertEqual(os.stat(self.zip_path).st_mode & 0o777, 0o644)
+            # an existing archive keeps its permissions
+            os.chmod(self.zip_path, 0o640)
+            with roi_write.IJZipWriter(self.zip_path, atomic=True) as writer:
+                writer.write(self.rois[0], 'extra')
+            self.assertEqual(os.stat(self.zip_path).st_mode & 0o777, 0o640)
+        finally:
+            os.umask(umask)
+        self.assertEqual(len(self.read_back()), len(self.rois) + 1)
+
+    def test_write(self):
+        with roi_write.IJZipWriter(self.zip_path) as writer:
+            writer.write(self.rois[0], self.names[0])
+        table = self.read_back()
+        np.testing.assert_array_equal(table.coordinates,
+                                      self.tables[0].points(0))
+
+
 def run():
     pass
 
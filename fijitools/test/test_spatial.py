@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Vladimir Shteyn
+@email: vladimir.shteyn@googlemail.com
+
+Copyright Vladimir Shteyn, 2018
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import unittest
+import numpy as np
+
+from fijitools.helpers import spatial
+
+
+def overlapping(boxes, box):
+    return np.flatnonzero(np.all((boxes[:, :2] <= box[2:]) &
+                                 (boxes[:, 2:] >= box[:2]), axis=1))
+
+
+class GridIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        lower = rng.uniform(0, 500, (1000, 2))
+        self.boxes = np.hstack([lower, lower + rng.uniform(0, 20, (1000, 2))])
+        self.index = spatial.GridIndex(self.boxes)
+        self.queries = np.hstack([lower[:50] - 10, lower[:50] + 25])
+
+    def test_query_boxes(self):
+        queries, ids = self.index.query_boxes(self.queries)
+        for i, box in enumerate(self.queries):
+            np.testing.assert_array_equal(ids[queries == i],
+                                          overlapping(self.boxes, box))
+
+    def test_query_point(self):
+        point = self.boxes[7, :2] + 1
+        np.testing.assert_array_equal(
+            self.index.query_point(point),
+            overlapping(self.boxes, np.concatenate([point, point])))
+
+    def test_nearest(self):
+        for point in [(250., 250.), (-100., 800.)]:
+            ids, distances = self.index.nearest(point, 5,
+                                                return_distance=True)
+            expected = np.sort(self.index.distance(point))[:5]
+            np.testing.assert_allclose(distances, expected)
+        self.assertEqual(len(self.index.nearest((0., 0.), 2000)), 1000)
+
+    def test_empty(self):
+        index = spatial.GridIndex(np.zeros((0, 4)))
+        self.assertEqual(len(index.query_box((0, 0, 10, 10))), 0)
+        self.assertEqual(len(index.nearest((0, 0))), 0)
+
+
+class PartitionedGridIndexTest(unittest.TestCase):
+    def test_wildcard(self):
+        boxes = np.array([[0, 0, 10, 10]] * 3, dtype=float)
+        # c, z, t of each box; 0 means every position
+        labels = np.array([[1, 1, 1], [1, 2, 1], [0, 2, 1]])
+        index = spatial.PartitionedGridIndex(boxes, labels)
+        np.testing.assert_array_equal(index.query_point((5, 5), (1, 2, 1)),
+                                      [1, 2])
+        np.testing.assert_array_equal(index.query_point((5, 5)), [0, 1, 2])
+        np.testing.assert_array_equal(index.nearest((20, 20), 3, (1, 1, 1)),
+                                      [0])
+
+
+def segment_distance(point, a, b):
+    t = np.clip(np.dot(point - a, b - a) / np.dot(b - a, b - a), 0, 1)
+    return np.hypot(*(point - a - t * (b - a)))
+
+
+class PointQueryTest(unittest.TestCase):
+    def setUp(self):
+        # a 10 pixel square with a 2 pixel square inside it, an empty ROI and
+        # a triangle
+        self.coordinates = np.array([[0, 0], [10, 0], [10, 10], [0, 10],
+                                     [2, 2], [4, 2], [4, 4], [2, 4],
+                                     [20, 0], [30, 0], [20, 10]], dtype=float)
+        self.offsets = np.array([0, 4, 8, 8, 11])
+        rng = np.random.RandomState(0)
+        self.points = rng.uniform(-5, 35, (200, 2))
+
+    def test_points_in_polygons(self):
+        point_ids, polygon_ids = spatial.points_in_polygons(
+            [[3, 3], [5, 5], [21, 1], [50, 50]], self.coordinates,
+            self.offsets)
+        np.testing.assert_array_equal(point_ids, [0, 0, 1, 2])
+        np.testing.assert_array_equal(polygon_ids, [0, 1, 0, 3])
+
+    def test_assign_points(self):
+        assigned = spatial.assign_points(self.points, self.coordinates,
+                                         self.offsets, chunk_size=30)
+        x, y = self.points.T
+        expected = np.full(len(self.points), -1)
+        expected[(x >= 0) & (x < 10) & (y >= 0) & (y < 10)] = 0
+        expected[(x >= 2) & (x < 4) & (y >= 2) & (y < 4)] = 1
+        expected[(x >= 20) & (y >= 0) & (x - 20 + y < 10)] = 3
+        np.testing.assert_array_equal(assigned, expected)
+
+    def test_nearest_lines(self):
+        ids, distances = spatial.nearest_lines(self.points, self.coordinates,
+                                               self.offsets, closed=True)
+        for point, i, distance in zip(self.points, ids, distances):
+            expected = [min(segment_distance(point, a, b) for a, b in
+                            zip(polygon, np.roll(polygon, -1, axis=0)))
+                        for polygon in np.split(self.coordinates,
+                                                self.offsets[1:-1])
+                        if len(polygon)]
+            self.assertAlmostEqual(distance, min(expected))
+        self.assertTrue(np.isin(ids, [0, 1, 3]).all())
+        # open lines don't have a segment from the last vertex to the first,
+        # so the nearest is the inner square's corner (2, 4)
+        ids, distances = spatial.nearest_lines([[-1., 5.]], self.coordinates,
+                                               self.offsets)
+        np.testing.assert_array_equal(ids, [1])
+        np.testing.assert_allclose(distances, [np.sqrt(10)])
+        ids, distances = spatial.nearest_lines(self.points, self.coordinates,
+                                               self.offsets, True, 1.)
+        self.assertTrue(np.all((ids == -1) == (distances > 1)))
+
+    def test_beyond_grid(self):
+        # the point is farther from the line than the grid extends, but
+        # within max_distance
+        line = np.array([[0., 0.], [10., 0.]])
+        expected = np.hypot(90, 100)
+        for max_distance in [None, 200., 1000.]:
+            ids, distances = spatial.nearest_lines(
+                [[100., 100.]], line, [0, 2], max_distance=max_distance)
+            np.testing.assert_array_equal(ids, [0])
+            np.testing.assert_allclose(distances, [expected])
+        ids, distances = spatial.nearest_lines([[100., 100.]], line, [0, 2],
+                                               max_distance=100.)
+        np.testing.assert_array_equal(ids, [-1])
+        np.testing.assert_array_equal(distances, [np.inf])
+
+
+def run():
+    pass
+
+
+if __name__ == '__main__':
+    run()